@@ -0,0 +1,134 @@
+"""
+SQLite attendance backend
+Stores every mark in one WAL-mode database indexed by (student, date)
+and (date, time), so per-student and date-range questions are answered
+from the indexes instead of by opening one CSV per day. Plugs into
+AttendanceWriter like the CSV log and can import the existing CSV history
+"""
+
+import csv
+import glob
+import os
+import sqlite3
+import sys
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance (name, date, time);
+CREATE INDEX IF NOT EXISTS idx_attendance_date_time ON attendance (date, time);
+"""
+
+class SqliteAttendanceLog:
+    def __init__(self, path):
+        self.path = path
+        # One connection per thread; close() may run on any of them
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Commits reach the WAL; sync() makes them durable with a checkpoint
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def write(self, rows):
+        """Insert (name, date, time) rows in one transaction"""
+        connection = self._connection()
+        try:
+            with connection:
+                connection.executemany('INSERT OR IGNORE INTO attendance (name, date, time) VALUES (?, ?, ?)',
+                                       rows)
+        except sqlite3.Error as e:
+            # AttendanceWriter retries batches that fail with OSError
+            raise OSError(f"SQLite write failed: {e}") from e
+
+    def sync(self):
+        """Make everything written so far durable"""
+        try:
+            self._connection().execute('PRAGMA wal_checkpoint(PASSIVE)')
+        except sqlite3.Error as e:
+            raise OSError(f"SQLite checkpoint failed: {e}") from e
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def day(self, date_string):
+        """(name, date, time) rows of one day, in time order"""
+        return self._connection().execute(
+            'SELECT name, date, time FROM attendance WHERE date = ? ORDER BY time', (date_string,)).fetchall()
+
+    def between(self, start_date, end_date):
+        """(name, date, time) rows from start_date to end_date inclusive"""
+        return self._connection().execute(
+            'SELECT name, date, time FROM attendance WHERE date BETWEEN ? AND ? ORDER BY date, time',
+            (start_date, end_date)).fetchall()
+
+    def student_history(self, name, start_date='0000-00-00', end_date='9999-99-99'):
+        """(date, time) of every mark for a student in a date range"""
+        return self._connection().execute(
+            'SELECT date, time FROM attendance WHERE name = ? AND date BETWEEN ? AND ? ORDER BY date, time',
+            (name, start_date, end_date)).fetchall()
+
+    def first_seen(self, start_date, end_date):
+        """(name, date, earliest time) of each student-day in a date range"""
+        return self._connection().execute(
+            'SELECT name, date, MIN(time) FROM attendance WHERE date BETWEEN ? AND ? GROUP BY name, date',
+            (start_date, end_date)).fetchall()
+
+    def days_present(self, start_date, end_date):
+        """Number of distinct days each student was present in a date range"""
+        return dict(self._connection().execute(
+            'SELECT name, COUNT(DISTINCT date) FROM attendance WHERE date BETWEEN ? AND ? GROUP BY name',
+            (start_date, end_date)).fetchall())
+
+    def import_csv(self, directory):
+        """Load attendance_YYYY-MM-DD.csv files; rows already present are skipped"""
+        connection = self._connection()
+        before = connection.total_changes
+        # One transaction for the whole history
+        with connection:
+            for filename in sorted(glob.glob(os.path.join(directory, 'attendance_*.csv'))):
+                with open(filename, 'r', newline='') as f:
+                    rows = [(row['Name'], row['Date'], row['Time']) for row in csv.DictReader(f)
+                            if row.get('Name') and row.get('Date') and row.get('Time')]
+                connection.executemany('INSERT OR IGNORE INTO attendance (name, date, time) VALUES (?, ?, ?)',
+                                       rows)
+        self.sync()
+        return connection.total_changes - before
+
+if __name__ == "__main__":
+    import config
+
+    log = SqliteAttendanceLog(config.ATTENDANCE_DB)
+    if len(sys.argv) >= 2 and sys.argv[1] == 'import':
+        directory = sys.argv[2] if len(sys.argv) > 2 else config.ATTENDANCE_DIR
+        print(f"Imported {log.import_csv(directory)} attendance rows from {directory} into {config.ATTENDANCE_DB}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'student':
+        history = log.student_history(*sys.argv[2:5])
+        for date_string, time_string in history:
+            print(date_string, time_string)
+        print(f"{sys.argv[2]}: present on {len({d for d, _ in history})} day(s)")
+    else:
+        print("Usage: python attendance_db.py import [csv_dir]")
+        print("       python attendance_db.py student NAME [start_date [end_date]]")
+    log.close()
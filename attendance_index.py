@@ -0,0 +1,162 @@
+"""
+Persistent same-day attendance index
+Keeps the names already marked today in memory for O(1) checks, backed
+by an append-only sidecar file (one name per line) that every process
+on the host shares under an exclusive file lock. Names are claimed in
+the sidecar, tagged with the claiming process id, before their row
+reaches the attendance log. On loading, claims of running processes and
+names with a row in today's records count as marked, while claims left
+by a process that has exited without logging the row are dropped. The
+index rolls over to a new sidecar when the date changes
+"""
+
+import glob
+import os
+import threading
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _process_alive(pid):
+    """Whether a process with this id is still running"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION; signal 0 would terminate it on Windows
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _claim(name):
+    return f"{name}\t{os.getpid()}\n".encode('utf-8')
+
+class AttendanceIndex:
+    def __init__(self, directory, attendance):
+        self.directory = directory
+        # Anything with day(date_string) -> (name, date, time) rows
+        self.attendance = attendance
+        self.date = None
+        self.names = set()
+
+        self._file = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def path(self, date_string):
+        return os.path.join(self.directory, f'marked_{date_string}.idx')
+
+    def load(self, date_string):
+        """Switch to date_string, reading its sidecar or rebuilding it from the records"""
+        with self._lock:
+            self._load(date_string)
+
+    def _load(self, date_string):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path(date_string), 'a+b')
+        self.date = date_string
+        self.names = set()
+        self._offset = 0
+
+        _lock_file(self._file)
+        try:
+            claims = self._read_new()
+            logged = {name for name, _, _ in self.attendance.day(date_string)}
+            # A claim whose row never reached the log (e.g. a crash before the
+            # writer flushed) must not stop the student being marked again,
+            # but a running session's claim may still be queued in its writer
+            live = {name for name, pid in claims if pid is not None and _process_alive(pid)}
+            missing = logged - {name for name, _ in claims}
+            self.names = logged | live
+            if missing:
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(b''.join(_claim(name) for name in sorted(missing)))
+                self._file.flush()
+                self._offset = self._file.tell()
+        finally:
+            _unlock_file(self._file)
+
+        # Earlier days' sidecars are no longer needed
+        for path in glob.glob(os.path.join(self.directory, 'marked_*.idx')):
+            if os.path.basename(path) < os.path.basename(self.path(date_string)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _read_new(self):
+        """Pick up names appended since the last read, by this or another process
+
+        Returns the new (name, claiming pid) entries; the pid is None for
+        lines written without one.
+        """
+        self._file.seek(self._offset)
+        data = self._file.read()
+        end = data.rfind(b'\n') + 1
+        claims = []
+        for line in data[:end].splitlines():
+            if line:
+                name, _, pid = line.decode('utf-8').partition('\t')
+                claims.append((name, int(pid) if pid.isdigit() else None))
+                self.names.add(name)
+        self._offset += end
+        return claims
+
+    def add(self, name, date_string):
+        """Record name as present on date_string; returns False if it already was"""
+        with self._lock:
+            if date_string != self.date:
+                self._load(date_string)
+            if name in self.names:
+                return False
+
+            _lock_file(self._file)
+            try:
+                self._read_new()
+                if name in self.names:
+                    return False
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(_claim(name))
+                self._file.flush()
+                self._offset = self._file.tell()
+            finally:
+                _unlock_file(self._file)
+            self.names.add(name)
+            return True
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,266 @@
+"""
+Streaming attendance reports
+Aggregates per-student attendance rates, first-seen times and daily
+headcounts over any date range. Daily CSVs are read one at a time into a
+compact columnar cache per month (student id, day, first-seen second),
+and a month is only rescanned for days whose file has changed, so
+repeat reports mostly just load the cached arrays. With the SQLite
+backend the same arrays are built from one indexed query instead
+"""
+
+import csv
+import glob
+import io
+import os
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+import config
+
+def _parse_seconds(time_string):
+    hours, minutes, seconds = time_string.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def _day_files(directory, year, month):
+    """day of month -> (path, size, mtime_ns) for the month's attendance CSVs"""
+    prefix = f'attendance_{year:04d}-{month:02d}-'
+    files = {}
+    for path in glob.glob(os.path.join(directory, prefix + '*.csv')):
+        try:
+            day = int(os.path.basename(path)[len(prefix):len(prefix) + 2])
+        except ValueError:
+            continue
+        stat = os.stat(path)
+        files[day] = (path, stat.st_size, stat.st_mtime_ns)
+    return files
+
+def _scan_day(path):
+    """First-seen second of the day for each student in one day's CSV"""
+    first_seen = {}
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 3:
+                continue
+            try:
+                seconds = _parse_seconds(row[2])
+            except ValueError:
+                continue
+            if seconds < first_seen.get(row[0], 86400):
+                first_seen[row[0]] = seconds
+    return first_seen
+
+def _read_cache(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable report cache {path}: {e}")
+        return None
+
+def _write_cache(path, month):
+    buffer = io.BytesIO()
+    np.savez(buffer, **month)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp, path)
+
+def load_month(year, month, directory=config.ATTENDANCE_DIR, cache_dir=config.REPORT_CACHE_DIR):
+    """Columnar attendance for one month, rescanning only days whose CSV changed
+
+    Returns a dict of arrays: names, and one row per student-day with
+    student (index into names), day (of the month) and seconds (first seen).
+    """
+    files = _day_files(directory, year, month)
+    cache_file = os.path.join(cache_dir, f'{year:04d}-{month:02d}.npz')
+    cached = _read_cache(cache_file)
+
+    signatures = {}
+    if cached is not None:
+        signatures = {int(day): (int(size), int(mtime)) for day, size, mtime
+                      in zip(cached['file_days'], cached['file_sizes'], cached['file_mtimes'])}
+    stale = [day for day, (_, size, mtime) in files.items() if signatures.get(day) != (size, mtime)]
+    stale += [day for day in signatures if day not in files]
+    if cached is not None and not stale:
+        return cached
+
+    # Keep the rows of unchanged days and scan the rest
+    if cached is not None:
+        names = [str(name) for name in cached['names']]
+        keep = ~np.isin(cached['day'], stale)
+        parts = [(cached['student'][keep], cached['day'][keep], cached['seconds'][keep])]
+    else:
+        names = []
+        parts = []
+    ids = {name: i for i, name in enumerate(names)}
+
+    for day in sorted(day for day in stale if day in files):
+        first_seen = _scan_day(files[day][0])
+        students = np.array([ids.setdefault(name, len(ids)) for name in first_seen], dtype=np.int32)
+        parts.append((students, np.full(len(students), day, dtype=np.int8),
+                      np.fromiter(first_seen.values(), dtype=np.int32, count=len(first_seen))))
+    names = list(ids)
+
+    student = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, dtype=np.int32)
+    day = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, dtype=np.int8)
+    seconds = np.concatenate([p[2] for p in parts]) if parts else np.zeros(0, dtype=np.int32)
+    order = np.lexsort((student, day))
+
+    file_days = sorted(files)
+    month_data = {
+        'names': np.array(names, dtype=str),
+        'student': student[order].astype(np.int32),
+        'day': day[order].astype(np.int8),
+        'seconds': seconds[order].astype(np.int32),
+        'file_days': np.array(file_days, dtype=np.int8),
+        'file_sizes': np.array([files[d][1] for d in file_days], dtype=np.int64),
+        'file_mtimes': np.array([files[d][2] for d in file_days], dtype=np.int64),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_cache(cache_file, month_data)
+    return month_data
+
+def _log_months(log, start_date, end_date):
+    """(year, month) -> columnar attendance as load_month() returns it, from a SQLite log"""
+    rows_by_month = {}
+    for name, date_string, time_string in log.first_seen(start_date, end_date):
+        try:
+            year, month, day = (int(part) for part in date_string.split('-'))
+            seconds = _parse_seconds(time_string)
+        except ValueError:
+            continue
+        rows_by_month.setdefault((year, month), []).append((name, day, seconds))
+
+    months = {}
+    for key, rows in rows_by_month.items():
+        ids = {}
+        student = np.array([ids.setdefault(name, len(ids)) for name, _, _ in rows], dtype=np.int32)
+        months[key] = {
+            'names': np.array(list(ids), dtype=str),
+            'student': student,
+            'day': np.array([day for _, day, _ in rows], dtype=np.int8),
+            'seconds': np.array([seconds for _, _, seconds in rows], dtype=np.int32),
+        }
+    return months
+
+def report_log():
+    """The SQLite log to report from when it is the configured backend, else None (daily CSVs)"""
+    if config.ATTENDANCE_BACKEND == 'sqlite':
+        from attendance_db import SqliteAttendanceLog
+        return SqliteAttendanceLog(config.ATTENDANCE_DB)
+    return None
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def build_report(start_date, end_date, directory=config.ATTENDANCE_DIR, cache_dir=config.REPORT_CACHE_DIR,
+                 log=None):
+    """Aggregate attendance between two YYYY-MM-DD dates (inclusive)
+
+    Reads the daily CSVs in directory, or log (a SqliteAttendanceLog) if
+    given. Returns a dict with the number of session days (days with any
+    attendance), per-student rows (name, days present, rate, first
+    date, last date, mean first-seen time) and daily headcounts.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+    ids = {}
+    days_present = np.zeros(0, dtype=np.int64)
+    seconds_sum = np.zeros(0, dtype=np.float64)
+    first_day = np.zeros(0, dtype=np.int64)
+    last_day = np.zeros(0, dtype=np.int64)
+    daily = {}
+
+    from_log = _log_months(log, start_date, end_date) if log is not None else None
+    for year, month in _months(start, end):
+        if from_log is not None:
+            month_data = from_log.get((year, month))
+            if month_data is None:
+                continue
+        else:
+            month_data = load_month(year, month, directory, cache_dir)
+        if len(month_data['student']) == 0:
+            continue
+        ordinals = date(year, month, 1).toordinal() + month_data['day'].astype(np.int64) - 1
+        in_range = (ordinals >= start.toordinal()) & (ordinals <= end.toordinal())
+        if not in_range.any():
+            continue
+
+        # Month-local student numbers to report-wide ones
+        global_ids = np.array([ids.setdefault(str(name), len(ids)) for name in month_data['names']],
+                              dtype=np.int64)
+        if len(ids) > len(days_present):
+            grow = len(ids) - len(days_present)
+            days_present = np.concatenate([days_present, np.zeros(grow, dtype=np.int64)])
+            seconds_sum = np.concatenate([seconds_sum, np.zeros(grow)])
+            first_day = np.concatenate([first_day, np.full(grow, np.iinfo(np.int64).max)])
+            last_day = np.concatenate([last_day, np.zeros(grow, dtype=np.int64)])
+
+        students = global_ids[month_data['student'][in_range]]
+        ordinals = ordinals[in_range]
+        days_present += np.bincount(students, minlength=len(ids))
+        seconds_sum += np.bincount(students, weights=month_data['seconds'][in_range], minlength=len(ids))
+        np.minimum.at(first_day, students, ordinals)
+        np.maximum.at(last_day, students, ordinals)
+
+        headcounts = np.bincount(ordinals - ordinals.min())
+        for offset in np.flatnonzero(headcounts):
+            daily[date.fromordinal(int(ordinals.min() + offset)).isoformat()] = int(headcounts[offset])
+
+    session_days = len(daily)
+    students = []
+    for name, i in sorted(ids.items()):
+        if days_present[i] == 0:
+            continue
+        students.append((name, int(days_present[i]), float(days_present[i] / session_days),
+                         date.fromordinal(int(first_day[i])).isoformat(),
+                         date.fromordinal(int(last_day[i])).isoformat(),
+                         format_seconds(seconds_sum[i] / days_present[i])))
+    return {
+        'start': start_date,
+        'end': end_date,
+        'session_days': session_days,
+        'students': students,
+        'daily': sorted(daily.items()),
+    }
+
+def write_report(report, directory):
+    """Write the per-student and daily tables as CSV; returns both paths"""
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"report_{report['start']}_{report['end']}")
+    with open(stem + '_students.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Days Present', 'Attendance Rate', 'First Date', 'Last Date', 'Mean First Seen'])
+        for name, days, rate, first, last, first_seen in report['students']:
+            writer.writerow([name, days, f"{rate:.3f}", first, last, first_seen])
+    with open(stem + '_daily.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Headcount'])
+        writer.writerows(report['daily'])
+    return stem + '_students.csv', stem + '_daily.csv'
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python attendance_report.py START_DATE END_DATE   (YYYY-MM-DD)")
+        sys.exit(1)
+    log = report_log()
+    report = build_report(sys.argv[1], sys.argv[2], log=log)
+    if log is not None:
+        log.close()
+    paths = write_report(report, config.REPORTS_DIR)
+    print(f"{len(report['students'])} students over {report['session_days']} session days")
+    print(f"Written to {paths[0]} and {paths[1]}")
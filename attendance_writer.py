@@ -0,0 +1,212 @@
+"""
+Buffered background attendance writer
+mark() only queues the row; a writer thread appends queued rows to the
+attendance log in batches (when enough have built up or after a short
+delay) and fsyncs according to a count/time durability policy, so the
+recognition thread never waits on file I/O. Failed rows are kept and
+retried; any still unwritten when the writer closes are returned by close()
+"""
+
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+import config
+
+# Attempts to write rows that are still failing when the writer closes
+CLOSE_RETRIES = 3
+CLOSE_RETRY_DELAY = 0.5
+
+class CsvAttendanceLog:
+    """Daily attendance_YYYY-MM-DD.csv files with a Name,Date,Time header"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._file = None
+        self._date = None
+
+    def path(self, date_string):
+        return os.path.join(self.directory, f'attendance_{date_string}.csv')
+
+    def _open(self, date_string):
+        if self._date == date_string:
+            return self._file
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path(date_string), 'a', newline='')
+        self._date = date_string
+        if self._file.tell() == 0:
+            csv.writer(self._file).writerow(['Name', 'Date', 'Time'])
+        return self._file
+
+    def write(self, rows):
+        """Append (name, date, time) rows, each to its own day's file"""
+        for name, date_string, time_string in rows:
+            csv.writer(self._open(date_string)).writerow([name, date_string, time_string])
+        if self._file is not None:
+            self._file.flush()
+
+    def sync(self):
+        """Make everything written so far durable"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def day(self, date_string):
+        """(name, date, time) rows of one day"""
+        path = self.path(date_string)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', newline='') as f:
+            return [(row['Name'], row['Date'], row['Time']) for row in csv.DictReader(f)]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._date = None
+
+class AttendanceWriter:
+    def __init__(self, log, batch_size=32, flush_interval=0.2, fsync_marks=32, fsync_interval=1.0):
+        self.log = log
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_marks = fsync_marks
+        self.fsync_interval = fsync_interval
+
+        self._queue = queue.Queue()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._closed = False
+        # Rows that could not be written by the time the writer closed
+        self.unwritten = []
+        self.stats = {'marks_written': 0, 'flushes': 0, 'syncs': 0, 'errors': 0}
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # Queued marks are written even if the program exits without close()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls):
+        """Create a writer for the attendance backend configured in config.py"""
+        if config.ATTENDANCE_BACKEND == 'sqlite':
+            from attendance_db import SqliteAttendanceLog
+            log = SqliteAttendanceLog(config.ATTENDANCE_DB)
+        elif config.ATTENDANCE_BACKEND == 'csv':
+            log = CsvAttendanceLog(config.ATTENDANCE_DIR)
+        else:
+            raise ValueError(f"Unknown attendance backend '{config.ATTENDANCE_BACKEND}', expected 'csv' or 'sqlite'")
+        return cls(log,
+                   batch_size=config.ATTENDANCE_BATCH_SIZE,
+                   flush_interval=config.ATTENDANCE_FLUSH_MS / 1000.0,
+                   fsync_marks=config.ATTENDANCE_FSYNC_MARKS,
+                   fsync_interval=config.ATTENDANCE_FSYNC_MS / 1000.0)
+
+    def mark(self, name, date_string, time_string):
+        """Queue an attendance row; returns immediately"""
+        if self._closed:
+            raise RuntimeError("Attendance writer is closed")
+        self._queue.put((name, date_string, time_string))
+
+    def flush(self):
+        """Block until every mark queued so far is written and synced"""
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(0.5):
+            if not self._thread.is_alive():
+                return
+
+    def day(self, date_string):
+        """Every mark of one day, including any still queued"""
+        self.flush()
+        return self.log.day(date_string)
+
+    def close(self):
+        """Drain the queue, sync and stop the writer thread; returns the rows that could not be written"""
+        if self._closed:
+            return self.unwritten
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.log.close()
+        if self.unwritten:
+            print(f"Error: {len(self.unwritten)} attendance row(s) could not be written: "
+                  f"{', '.join(f'{name} {date_string} {time_string}' for name, date_string, time_string in self.unwritten)}")
+        return self.unwritten
+
+    def _run(self):
+        batch = []
+        flush_at = None
+        while True:
+            # Sleep until the batch is due or unsynced rows reach the time limit
+            deadlines = []
+            if flush_at is not None:
+                deadlines.append(flush_at)
+            if self._unsynced and self.fsync_interval:
+                deadlines.append(self._last_sync + self.fsync_interval)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item is None or isinstance(item, threading.Event):
+                batch = self._write(batch, sync=True)
+                # Rows that failed stay queued for another attempt
+                flush_at = None if not batch else time.monotonic() + self.flush_interval
+                if item is None:
+                    for _ in range(CLOSE_RETRIES):
+                        if not batch:
+                            break
+                        time.sleep(CLOSE_RETRY_DELAY)
+                        batch = self._write(batch, sync=True)
+                    self.unwritten = batch
+                    return
+                item.set()
+                continue
+
+            if item is not False:
+                batch.append(item)
+                if flush_at is None:
+                    flush_at = time.monotonic() + self.flush_interval
+
+            now = time.monotonic()
+            if batch and (len(batch) >= self.batch_size or flush_at is None or now >= flush_at):
+                batch = self._write(batch)
+                flush_at = None if not batch else now + self.flush_interval
+            elif self._unsynced and self.fsync_interval and now - self._last_sync >= self.fsync_interval:
+                self._write([], sync=True)
+
+    def _write(self, batch, sync=False):
+        """Write a batch; returns the rows still to be written if it failed"""
+        if batch:
+            try:
+                self.log.write(batch)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Error writing attendance: {e}")
+                # Keep the rows and try again with the next batch
+                return batch
+            self.stats['marks_written'] += len(batch)
+            self.stats['flushes'] += 1
+            self._unsynced += len(batch)
+
+        if self._unsynced and (sync or (self.fsync_marks and self._unsynced >= self.fsync_marks)):
+            try:
+                self._sync()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Error syncing attendance: {e}")
+        return []
+
+    def _sync(self):
+        self.log.sync()
+        self.stats['syncs'] += 1
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
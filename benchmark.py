@@ -0,0 +1,297 @@
+"""
+Offline benchmark suite
+Measures matcher throughput on synthetic rosters, per-frame latency and
+recall of each face detector backend, detection and encoding latency on
+still images and end-to-end frames/sec on a recorded clip, without a
+camera, and writes the results as JSON so runs can be compared across
+releases
+
+Usage: python benchmark.py [--sizes 1000 10000 100000 1000000]
+                           [--images Screenshots] [--clip lecture.mp4]
+                           [--detectors hog haar lbp ssd yunet]
+                           [--truth faces.json] [--output benchmark.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import config
+from face_detector import DETECTOR_TYPES, create_detector, detector_options
+from face_index import synthetic_roster
+from face_matcher import FaceMatcher
+from face_tracker import box_iou
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+def _timed(function, repeats):
+    """Median wall time of function() in milliseconds, and its last result"""
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+def bench_matcher(sizes, num_queries=256, kinds=('brute', 'ivf'), tolerance=config.RECOGNITION_TOLERANCE):
+    """Build time, per-face latency and batched throughput of the matcher per roster size"""
+    results = []
+    for size in sizes:
+        roster, queries, _ = synthetic_roster(size, num_queries)
+        names = [f'student_{i}' for i in range(size)]
+        for kind in kinds:
+            start = time.perf_counter()
+            matcher = FaceMatcher(roster, names, tolerance=tolerance, index=kind,
+                                  candidates=config.TEMPLATE_CANDIDATES)
+            build_s = time.perf_counter() - start
+
+            # One face per call, as in a sparse doorway frame
+            singles = min(num_queries, 64)
+            start = time.perf_counter()
+            for q in range(singles):
+                matcher.identify(queries[q:q + 1])
+            single_ms = (time.perf_counter() - start) * 1000 / singles
+
+            # Every face in one call, as in a crowded frame
+            batch_ms, _ = _timed(lambda: matcher.identify(queries), 3)
+            results.append({
+                'roster_size': size,
+                'index': kind,
+                'build_s': build_s,
+                'ms_per_face': single_ms,
+                'batch_faces_per_s': num_queries / (batch_ms / 1000) if batch_ms > 0 else 0.0,
+            })
+            print(f"  matcher {kind:<6} {size:>8} encodings: {single_ms:8.3f} ms/face, "
+                  f"{results[-1]['batch_faces_per_s']:10.0f} faces/s batched")
+    return results
+
+def _images(image_dir):
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+    return sorted(paths)
+
+def _recalled(truth, found, min_iou):
+    """Number of true boxes matched by a distinct detection"""
+    if not truth or not found:
+        return 0
+    scores = box_iou(truth, found)
+    hits = 0
+    for row in scores:
+        best = int(np.argmax(row))
+        if row[best] >= min_iou:
+            # Each detection matches one true box at most
+            scores[:, best] = -1.0
+            hits += 1
+    return hits
+
+def _reference_boxes(frames, truth_file):
+    """Ground-truth boxes per image: a JSON file, or HOG with upsampling on the full frame"""
+    if truth_file:
+        with open(truth_file, 'r') as f:
+            truth = json.load(f)
+        return {name: [tuple(box) for box in truth.get(name, [])] for name in frames}, truth_file
+    try:
+        reference = create_detector('hog', upsample=1)
+    except ImportError:
+        return None, None
+    return {name: reference.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for name, frame in frames.items()}, \
+        "hog on full-resolution frames"
+
+def bench_detectors(image_dir, kinds=tuple(DETECTOR_TYPES), truth_file=None, min_iou=0.4, repeats=3,
+                    resize_factor=config.FRAME_RESIZE_FACTOR):
+    """Per-frame latency and recall of each detector backend at the live resize factor"""
+    frames = {os.path.basename(path): cv2.imread(path) for path in _images(image_dir)}
+    frames = {name: frame for name, frame in frames.items() if frame is not None}
+    if not frames:
+        return {'skipped': f"no images found in {image_dir}"}
+    truth, truth_source = _reference_boxes(frames, truth_file)
+    small = {name: cv2.cvtColor(cv2.resize(frame, (0, 0), fx=resize_factor, fy=resize_factor),
+                                cv2.COLOR_BGR2RGB)
+             for name, frame in frames.items()}
+
+    results = []
+    for kind in kinds:
+        try:
+            detector = create_detector(kind, **detector_options(kind))
+        except (ImportError, OSError, ValueError, cv2.error) as e:
+            results.append({'detector': kind, 'skipped': str(e)})
+            print(f"  {kind:<6} skipped: {e}")
+            continue
+
+        times = []
+        found = 0
+        hits = 0
+        for name, image in small.items():
+            ms, locations = _timed(lambda: detector.detect(image), repeats)
+            times.append(ms)
+            # Boxes back to full-frame coordinates, as the pipeline reports them
+            locations = [tuple(int(v / resize_factor) for v in box) for box in locations]
+            found += len(locations)
+            if truth is not None:
+                hits += _recalled(truth[name], locations, min_iou)
+
+        total_truth = sum(len(boxes) for boxes in truth.values()) if truth is not None else 0
+        results.append({
+            'detector': kind,
+            'median_ms': statistics.median(times),
+            'faces_found': found,
+            'recall': hits / total_truth if total_truth else None,
+        })
+        recall = f"{results[-1]['recall']:.2f}" if results[-1]['recall'] is not None else "n/a"
+        print(f"  {kind:<6} {results[-1]['median_ms']:8.1f} ms/frame, {found} face(s), recall {recall}")
+    return {'truth': truth_source, 'min_iou': min_iou, 'resize_factor': resize_factor, 'detectors': results}
+
+def _analysis_unavailable():
+    """A 'skipped' result if the configured detector or encoder cannot be loaded, else None"""
+    try:
+        # The backends import face_recognition/dlib only when they are built
+        from face_analysis import get_detector, get_encoder
+        get_detector()
+        get_encoder()
+    except (ImportError, OSError) as e:
+        return {'skipped': f"face analysis backend is not available: {e}"}
+    return None
+
+def bench_analysis(image_dir, repeats=3):
+    """Detection and encoding latency per still image"""
+    skipped = _analysis_unavailable()
+    if skipped:
+        return skipped
+    from face_analysis import detect_faces, encode_faces
+
+    results = []
+    for path in _images(image_dir):
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        try:
+            detect_ms, face_locations = _timed(lambda: detect_faces(frame), repeats)
+            encode_ms, _ = _timed(lambda: encode_faces(frame, face_locations), repeats)
+        except ImportError as e:
+            return {'skipped': f"face analysis backend is not available: {e}"}
+        results.append({
+            'image': os.path.basename(path),
+            'width': frame.shape[1],
+            'height': frame.shape[0],
+            'faces': len(face_locations),
+            'detect_ms': detect_ms,
+            'encode_ms': encode_ms,
+            'encode_ms_per_face': encode_ms / len(face_locations) if face_locations else None,
+        })
+        print(f"  {results[-1]['image']}: {len(face_locations)} face(s), "
+              f"detect {detect_ms:.1f} ms, encode {encode_ms:.1f} ms")
+    if not results:
+        return {'skipped': f"no images found in {image_dir}"}
+    return {
+        'images': results,
+        'median_detect_ms': statistics.median(r['detect_ms'] for r in results),
+        'median_encode_ms': statistics.median(r['encode_ms'] for r in results),
+    }
+
+def synthetic_clip(image_dir, path, frames=150, fps=25, size=(640, 480)):
+    """Write a short clip that pans slowly across the still images"""
+    stills = [cv2.resize(image, size) for image in map(cv2.imread, _images(image_dir)) if image is not None]
+    if not stills:
+        return False
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frames):
+        still = stills[i * len(stills) // frames]
+        shift = np.float32([[1, 0, (i % 20) - 10], [0, 1, 0]])
+        writer.write(cv2.warpAffine(still, shift, size, borderMode=cv2.BORDER_REPLICATE))
+    writer.release()
+    return True
+
+def bench_end_to_end(clip, roster_size=1000):
+    """Frames/sec and faces/sec of recognition on every frame of a clip"""
+    skipped = _analysis_unavailable()
+    if skipped:
+        return skipped
+    from recognizer import FaceRecognizer
+    from video_processor import VideoProcessor
+
+    roster, _, _ = synthetic_roster(roster_size, 1)
+    matcher = FaceMatcher.from_config(roster, [f'student_{i}' for i in range(roster_size)])
+    processor = VideoProcessor(FaceRecognizer(matcher), sample_interval=0, workers=1)
+    try:
+        _, stats = processor.process(clip)
+    except ImportError as e:
+        return {'skipped': f"face analysis backend is not available: {e}"}
+    print(f"  end to end: {stats['fps']:.1f} frames/s, {stats['faces_per_second']:.1f} faces/s")
+    return {'clip': os.path.basename(clip), 'roster_size': roster_size, **stats}
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'config': {
+            'FRAME_RESIZE_FACTOR': config.FRAME_RESIZE_FACTOR,
+            'RECOGNITION_TOLERANCE': config.RECOGNITION_TOLERANCE,
+            'MATCHER_INDEX': config.MATCHER_INDEX,
+            'DETECTOR_BACKEND': config.DETECTOR_BACKEND,
+            'EMBEDDING_BACKEND': config.EMBEDDING_BACKEND,
+            'TRACKING_ENABLED': config.TRACKING_ENABLED,
+        },
+    }
+
+def run(sizes, image_dir, clip=None, output=None, detectors=tuple(DETECTOR_TYPES), truth_file=None):
+    """Run every benchmark and write the JSON results; returns them"""
+    results = {'environment': environment()}
+
+    print("Matcher throughput...")
+    results['matcher'] = bench_matcher(sizes)
+
+    print(f"Detector backends on {image_dir}...")
+    results['detectors'] = bench_detectors(image_dir, detectors, truth_file)
+
+    print(f"Detection and encoding on {image_dir}...")
+    results['analysis'] = bench_analysis(image_dir)
+
+    print("End-to-end recognition...")
+    if clip is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            generated = os.path.join(tmp, 'synthetic.avi')
+            if synthetic_clip(image_dir, generated):
+                results['end_to_end'] = bench_end_to_end(generated)
+                if 'skipped' not in results['end_to_end']:
+                    results['end_to_end']['clip'] = f"synthetic ({image_dir})"
+            else:
+                results['end_to_end'] = {'skipped': f"no clip given and no images in {image_dir}"}
+    else:
+        results['end_to_end'] = bench_end_to_end(clip)
+
+    output = output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the attendance system")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000, 1000000],
+                        help="synthetic roster sizes for the matcher benchmark")
+    parser.add_argument('--images', default='Screenshots', help="folder of still images with faces")
+    parser.add_argument('--clip', help="recorded video for the end-to-end benchmark "
+                                       "(default: a clip generated from the still images)")
+    parser.add_argument('--detectors', nargs='+', default=list(DETECTOR_TYPES), choices=list(DETECTOR_TYPES),
+                        help="detector backends to compare")
+    parser.add_argument('--truth', help="JSON of true face boxes per image, {name: [[top, right, bottom, left]]} "
+                                        "(default: HOG on the full-resolution images)")
+    parser.add_argument('--output', help="JSON results file")
+    args = parser.parse_args()
+    run(args.sizes, args.images, args.clip, args.output, args.detectors, args.truth)
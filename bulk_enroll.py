@@ -0,0 +1,158 @@
+"""
+Bulk enrolment from a labelled photo archive
+Walks a name/*.jpg tree, detects and encodes one face per photo across a
+process pool and journals every student into the encoding store in a
+single batched commit, with a per-image report of rejected photos
+"""
+
+import csv
+import functools
+import multiprocessing as mp
+import os
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import config
+from face_analysis import encode_faces, get_detector
+from face_detector import create_detector, detector_options
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def scan_archive(root):
+    """List (name, path) for every image in a name/*.jpg tree"""
+    items = []
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((name, os.path.join(folder, filename)))
+    return items
+
+def read_image(path, min_side=config.ENROL_MIN_IMAGE_SIDE):
+    """Decode an image at half resolution when it stays at least min_side pixels"""
+    # JPEG is decoded straight to half size by DCT scaling, skipping most of the work
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_COLOR_2)
+    if image is not None and min(image.shape[:2]) < min_side:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+    return image
+
+# Created on first use in each worker process
+_hog_detectors = {}
+
+def enrol_detector(upsample=config.ENROL_DETECT_UPSAMPLE):
+    """The configured face detector; HOG uses the enrolment upsampling instead of the live one"""
+    if config.DETECTOR_BACKEND != 'hog':
+        return get_detector()
+    if upsample not in _hog_detectors:
+        _hog_detectors[upsample] = create_detector('hog', **{**detector_options('hog'), 'upsample': upsample})
+    return _hog_detectors[upsample]
+
+def encode_image(path, upsample=config.ENROL_DETECT_UPSAMPLE, min_side=config.ENROL_MIN_IMAGE_SIDE):
+    """Encode the single face in an enrolment photo; returns (status, face count, encoding)"""
+    image = read_image(path, min_side)
+    if image is None:
+        return 'unreadable', 0, None
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = enrol_detector(upsample).detect(rgb_image)
+    if not face_locations:
+        return 'no_face', 0, None
+    if len(face_locations) > 1:
+        return 'multiple_faces', len(face_locations), None
+    encoding = encode_faces(image, face_locations)[0]
+    return 'ok', 1, np.asarray(encoding, dtype=np.float32)
+
+def _init_worker():
+    # One OpenCV thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+
+def _encode_task(item, upsample=config.ENROL_DETECT_UPSAMPLE):
+    name, path = item
+    try:
+        status, faces, encoding = encode_image(path, upsample)
+    except Exception as e:
+        status, faces, encoding = f"error: {type(e).__name__}: {e}", 0, None
+    return name, path, status, faces, encoding
+
+def encode_images(items, workers=None, upsample=config.ENROL_DETECT_UPSAMPLE):
+    """Encode (name, path) items across a process pool
+
+    Yields (name, path, status, face count, encoding) in completion order.
+    """
+    if not items:
+        return
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, min(32, len(items) // (workers * 8)))
+    task = functools.partial(_encode_task, upsample=upsample)
+    with mp.Pool(workers, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(task, items, chunksize)
+
+def write_report(report, report_file):
+    """Write the per-image results as CSV"""
+    directory = os.path.dirname(report_file)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(report_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Image', 'Status', 'Faces'])
+        writer.writerows(sorted(report))
+
+def bulk_enroll(root, store, workers=None, report_file=None):
+    """Enrol every student in a name/*.jpg archive into store
+
+    Photos with no face or more than one face are rejected. Returns a
+    summary dict; the per-image results are written to report_file.
+    """
+    items = scan_archive(root)
+    if report_file is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_file = os.path.join(config.ENROLMENT_REPORTS_DIR, f'enrolment_{stamp}.csv')
+
+    start = time.perf_counter()
+    encodings_by_student = {}
+    report = []
+    for name, path, status, faces, encoding in encode_images(items, workers):
+        report.append((name, path, status, faces))
+        if encoding is not None:
+            encodings_by_student.setdefault(name, []).append(encoding)
+    encode_time = time.perf_counter() - start
+
+    # Every student goes into the journal with a single fsync
+    enrolments = [(np.stack(encodings), name) for name, encodings in sorted(encodings_by_student.items())]
+    if enrolments:
+        store.append_batch(enrolments)
+    write_report(report, report_file)
+
+    statuses = [status for _, _, status, _ in report]
+    return {
+        'images': len(items),
+        'enrolled_images': statuses.count('ok'),
+        'students': len(enrolments),
+        'no_face': statuses.count('no_face'),
+        'multiple_faces': statuses.count('multiple_faces'),
+        'unreadable': statuses.count('unreadable'),
+        'errors': sum(status.startswith('error') for status in statuses),
+        'seconds': encode_time,
+        'images_per_second': len(items) / encode_time if encode_time > 0 else 0.0,
+        'report_file': report_file,
+    }
+
+if __name__ == "__main__":
+    from encoding_store import EncodingStore
+
+    if len(sys.argv) < 2:
+        print("Usage: python bulk_enroll.py <archive_dir> [workers]")
+        sys.exit(1)
+    store = EncodingStore.from_config()
+    summary = bulk_enroll(sys.argv[1], store, int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    store.close()
+    print(f"Enrolled {summary['students']} students from {summary['enrolled_images']}/{summary['images']} images "
+          f"({summary['images_per_second']:.0f} images/s)")
+    print(f"Rejected: {summary['no_face']} no face, {summary['multiple_faces']} multiple faces, "
+          f"{summary['unreadable']} unreadable, {summary['errors']} errors")
+    print(f"Report: {summary['report_file']}")
@@ -0,0 +1,78 @@
+"""
+Per-camera regions of interest
+Restricts face detection to configured rectangles or polygons of a
+camera's view, e.g. the doorway of a hallway camera. Detection runs on
+ndarray views of each region's bounding box (no copy), the boxes are
+mapped back to frame coordinates, and faces whose centre falls outside
+a polygon are dropped
+"""
+
+import cv2
+import numpy as np
+
+import config
+from face_tracker import box_iou
+
+class RegionsOfInterest:
+    def __init__(self, regions):
+        """regions: (x, y, w, h) rectangles and/or [(x, y), ...] polygons in frame pixels"""
+        self.polygons = []
+        self.bounds = []
+        for region in regions:
+            if len(region) == 4 and all(np.isscalar(value) for value in region):
+                x, y, w, h = (int(value) for value in region)
+                polygon = np.array([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], dtype=np.int32)
+                is_rectangle = True
+            else:
+                polygon = np.array(region, dtype=np.int32).reshape(-1, 2)
+                if len(polygon) < 3:
+                    raise ValueError(f"A region needs 4 numbers (x, y, w, h) or at least 3 points, got {region}")
+                is_rectangle = False
+            x0, y0 = polygon.min(axis=0)
+            x1, y1 = polygon.max(axis=0)
+            self.polygons.append(polygon)
+            # Rectangles need no point-in-polygon test
+            self.bounds.append((int(x0), int(y0), int(x1), int(y1), None if is_rectangle else polygon))
+
+    @classmethod
+    def from_config(cls, source):
+        """Regions configured for a camera index or video path, or None to use the whole frame"""
+        regions = config.CAMERA_ROIS.get(source)
+        return cls(regions) if regions else None
+
+    def views(self, frame):
+        """(view, (top, left), polygon) for each region; the views share the frame's memory"""
+        height, width = frame.shape[:2]
+        for x0, y0, x1, y1, polygon in self.bounds:
+            x0, y0 = max(x0, 0), max(y0, 0)
+            x1, y1 = min(x1, width), min(y1, height)
+            if x1 > x0 and y1 > y0:
+                yield frame[y0:y1, x0:x1], (y0, x0), polygon
+
+    def detect(self, frame, detect):
+        """Run detect(view) -> view locations on every region; returns frame locations"""
+        face_locations = []
+        for view, (top_offset, left_offset), polygon in self.views(frame):
+            for top, right, bottom, left in detect(view):
+                location = (top + top_offset, right + left_offset, bottom + top_offset, left + left_offset)
+                centre = ((location[1] + location[3]) / 2, (location[0] + location[2]) / 2)
+                if polygon is not None and cv2.pointPolygonTest(polygon, centre, False) < 0:
+                    continue
+                # Overlapping regions can see the same face twice
+                if face_locations and box_iou([location], face_locations).max() > 0.5:
+                    continue
+                face_locations.append(location)
+        return face_locations
+
+    def coverage(self, shape):
+        """Fraction of a frame's pixels that detection looks at"""
+        height, width = shape[:2]
+        if height == 0 or width == 0:
+            return 0.0
+        pixels = sum(max(0, min(x1, width) - max(x0, 0)) * max(0, min(y1, height) - max(y0, 0))
+                     for x0, y0, x1, y1, _ in self.bounds)
+        return min(pixels / (height * width), 1.0)
+
+    def draw(self, frame, color=(255, 200, 0)):
+        """Outline the regions on a display frame"""
+        cv2.polylines(frame, self.polygons, True, color, 1)
@@ -3,24 +3,48 @@ Command Line Interface Version
 Alternative to GUI for terminal users
 """
 
+import argparse
 import cv2
-import face_recognition
-import numpy as np
 import os
 from datetime import datetime
-import csv
-import pickle
 import sys
+import config
+import instrumentation
+from bulk_enroll import bulk_enroll
+from encoding_cache import rebuild_roster
+from attendance_index import AttendanceIndex
+from attendance_report import build_report, write_report
+from attendance_writer import AttendanceWriter
+from camera_roi import RegionsOfInterest
+from encoding_store import EncodingStore, ModelMismatchError
+from face_analysis import detect_faces, encode_faces, get_encoder
+from face_matcher import FaceMatcher
+from frame_scheduler import FrameScheduler
+from motion_gate import MotionGate
+from multi_camera import MultiCameraSession
+from pipeline import RecognitionPipeline
+from recognizer import FaceRecognizer
+from video_processor import VideoProcessor, format_timestamp, write_attendance
+from worker_pool import InferencePool
 
 class FaceRecognitionCLI:
     def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.matcher = FaceMatcher.from_config()
+        self.store = EncodingStore.from_config()
         self.attendance_marked = set()
+        self.attendance = AttendanceWriter.from_config()
+        self.attendance_index = AttendanceIndex(config.ATTENDANCE_DIR, self.attendance)
+        self.attendance_index.load(datetime.now().strftime('%Y-%m-%d'))
+        instrumentation.configure()
         
         self.create_directories()
         self.load_encodings()
         
+    @property
+    def known_face_names(self):
+        """Names of the registered students"""
+        return self.matcher.students
+        
     def create_directories(self):
         """Create necessary directories"""
         directories = ['students_images', 'attendance_records', 'encodings']
@@ -30,26 +54,40 @@ class FaceRecognitionCLI:
                 
     def load_encodings(self):
         """Load face encodings"""
-        encoding_file = 'encodings/face_encodings.pkl'
-        if os.path.exists(encoding_file):
+        # The store is tagged with the encoder's model, so check the encoder loads before touching it
+        try:
+            get_encoder()
+        except (ImportError, OSError, ValueError, cv2.error) as e:
+            print(f"✗ Could not load the '{config.EMBEDDING_BACKEND}' face encoder: {e}")
+            print("  Encodings were not loaded; check EMBEDDING_BACKEND and the model files in config.py")
+            return
+            
+        try:
+            if not self.store.exists() and os.path.exists(config.ENCODINGS_FILE):
+                count = self.store.migrate_from_pickle(config.ENCODINGS_FILE)
+                print(f"✓ Migrated {count} student(s) to {config.ENCODING_STORE_DIR}")
+                
+            self.load_store()
+        except ModelMismatchError as e:
+            # Encodings of different models are never mixed; re-encode from the saved photos
+            print(f"⚠ {e}")
             try:
-                with open(encoding_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data['encodings']
-                    self.known_face_names = data['names']
-                print(f"✓ Loaded {len(self.known_face_names)} student(s)")
+                self.rebuild_roster()
             except Exception as e:
-                print(f"✗ Error loading encodings: {e}")
+                print(f"✗ Error re-encoding the roster: {e}")
+        except Exception as e:
+            print(f"✗ Error loading encodings: {e}")
+            
+    def load_store(self):
+        """Load the encoding store into the matcher"""
+        if self.store.exists():
+            encodings, norms, names = self.store.load()
+            self.matcher = FaceMatcher.from_config(encodings, names, norms)
+            print(f"✓ Loaded {len(self.known_face_names)} student(s)")
                 
     def save_encodings(self):
-        """Save face encodings"""
-        encoding_file = 'encodings/face_encodings.pkl'
-        data = {
-            'encodings': self.known_face_encodings,
-            'names': self.known_face_names
-        }
-        with open(encoding_file, 'wb') as f:
-            pickle.dump(data, f)
+        """Write a full snapshot of the face encodings"""
+        self.store.save(self.matcher.matrix, self.matcher.names)
         print("✓ Encodings saved")
         
     def add_new_student(self, name, num_images=5):
@@ -58,7 +96,7 @@ class FaceRecognitionCLI:
         if not os.path.exists(student_dir):
             os.makedirs(student_dir)
             
-        cap = cv2.VideoCapture(0)
+        cap = cv2.VideoCapture(config.CAMERA_INDEX)
         count = 0
         encodings_list = []
         
@@ -82,11 +120,11 @@ class FaceRecognitionCLI:
                 image_path = f'{student_dir}/image_{count}.jpg'
                 cv2.imwrite(image_path, frame)
                 
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
+                # Full resolution, with the configured detector
+                face_locations = detect_faces(frame, 1.0)
                 
                 if face_locations:
-                    face_encoding = face_recognition.face_encodings(rgb_frame, face_locations)[0]
+                    face_encoding = encode_faces(frame, face_locations)[0]
                     encodings_list.append(face_encoding)
                     count += 1
                     print(f"   ✓ Image {count}/{num_images} captured")
@@ -103,118 +141,237 @@ class FaceRecognitionCLI:
         cv2.destroyAllWindows()
         
         if encodings_list:
-            avg_encoding = np.mean(encodings_list, axis=0)
-            self.known_face_encodings.append(avg_encoding)
-            self.known_face_names.append(name)
-            self.save_encodings()
+            self.matcher.add(encodings_list, name)
+            self.store.append_add(encodings_list, name)
             print(f"\n✓ {name} added successfully!\n")
             return True
         return False
         
+    def bulk_import(self, archive_dir, workers=None):
+        """Enrol every student in a name/*.jpg photo archive"""
+        if not os.path.isdir(archive_dir):
+            print(f"\n✗ {archive_dir} is not a directory\n")
+            return None
+            
+        print(f"\n📂 Importing photos from {archive_dir}...")
+        summary = bulk_enroll(archive_dir, self.store, workers)
+        self.load_encodings()
+        
+        print(f"   ✓ Enrolled {summary['students']} student(s) from "
+              f"{summary['enrolled_images']}/{summary['images']} image(s) "
+              f"({summary['images_per_second']:.0f} images/s)")
+        rejected = summary['images'] - summary['enrolled_images']
+        if rejected:
+            print(f"   ✗ Rejected {rejected}: {summary['no_face']} no face, "
+                  f"{summary['multiple_faces']} multiple faces, {summary['unreadable']} unreadable, "
+                  f"{summary['errors']} error(s)")
+        print(f"   Report: {summary['report_file']}\n")
+        return summary
+        
+    def rebuild_roster(self, workers=None):
+        """Re-encode the roster from students_images, reusing cached encodings"""
+        print(f"\n🔄 Rebuilding roster from {config.STUDENTS_DIR}...")
+        summary = rebuild_roster(self.store, config.STUDENTS_DIR, config.ENCODING_CACHE_DIR, workers)
+        self.load_store()
+        
+        print(f"   ✓ {summary['students']} student(s) from {summary['enrolled_images']}/{summary['images']} image(s) "
+              f"in {summary['seconds']:.1f}s ({summary['encoded']} encoded, {summary['cached']} cached)")
+        if summary['rejected']:
+            print(f"   ✗ Rejected {summary['rejected']} image(s)")
+        if summary['kept_students']:
+            print(f"   Kept {summary['kept_students']} student(s) without photos")
+        if summary['dropped_students']:
+            print(f"   ✗ Not re-encoded (no photos, kept in {summary['archived_roster']}): "
+                  f"{', '.join(summary['dropped_students'])}")
+        print(f"   Report: {summary['report_file']}\n")
+        return summary
+        
     def mark_attendance(self, name):
         """Mark attendance"""
         now = datetime.now()
         date_string = now.strftime('%Y-%m-%d')
         time_string = now.strftime('%H:%M:%S')
         
-        filename = f'attendance_records/attendance_{date_string}.csv'
-        
-        if name in self.attendance_marked:
+        if not self.attendance_index.add(name, date_string):
             return False
             
-        file_exists = os.path.exists(filename)
-        with open(filename, 'a', newline='') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(['Name', 'Date', 'Time'])
-            writer.writerow([name, date_string, time_string])
-            
+        self.attendance.mark(name, date_string, time_string)
         self.attendance_marked.add(name)
         return True
         
+    def on_face_recognized(self, name):
+        """Mark attendance"""
+        with instrumentation.metrics.stage('attendance'):
+            marked = self.mark_attendance(name)
+        if marked:
+            print(f"   ✓ Attendance marked for {name}")
+            
+    def draw_results(self, frame, results):
+        """Draw latest results"""
+        face_locations, face_names = results if results else ([], [])
+        for (top, right, bottom, left), name in zip(face_locations, face_names):
+            color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
+            cv2.putText(frame, name, (left + 6, bottom - 6),
+                       cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+                       
+        cv2.putText(frame, f"Marked: {len(self.attendance_marked)}", (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
     def recognize_faces(self):
         """Start face recognition"""
-        cap = cv2.VideoCapture(0)
+        if len(config.CAMERA_SOURCES) > 1:
+            return self.recognize_faces_multi(config.CAMERA_SOURCES)
+            
+        cap = cv2.VideoCapture(config.CAMERA_SOURCES[0])
         self.attendance_marked.clear()
         
         print("\n📹 Starting face recognition...")
         print("   Press 'q' to quit\n")
         
-        frame_count = 0
-        process_every_n_frames = 2
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            frame_count += 1
+        roi = RegionsOfInterest.from_config(config.CAMERA_SOURCES[0])
+        if roi is not None:
+            shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+            print(f"   Detection limited to {roi.coverage(shape):.0%} of the frame\n")
+        recognizer = FaceRecognizer(self.matcher, on_match=self.on_face_recognized, roi=roi)
+        pool = InferencePool(recognizer.analyze, config.INFERENCE_WORKERS) if config.INFERENCE_WORKERS > 1 else None
+        pipeline = RecognitionPipeline(cap, recognizer.analyze, recognizer.identify, self.draw_results,
+                                       'Attendance System',
+                                       queue_size=config.PIPELINE_QUEUE_SIZE,
+                                       display_fps=config.DISPLAY_FPS, pool=pool,
+                                       scheduler=FrameScheduler.from_config(config.INFERENCE_WORKERS),
+                                       gate=MotionGate.from_config(), roi=roi,
+                                       show_metrics=config.SHOW_PIPELINE_METRICS)
+        try:
+            stats = pipeline.run()
+        finally:
+            cap.release()
+            cv2.destroyAllWindows()
+            if pool is not None:
+                pool.close()
             
-            if frame_count % process_every_n_frames == 0:
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        print(f"\n✓ Attendance complete! Marked: {len(self.attendance_marked)} student(s)")
+        print(f"   Display {stats['display_fps']:.1f} FPS | Recognition {stats['inference_fps']:.1f} FPS "
+              f"(every {pipeline.metrics()['every_n']} frame(s)) | "
+              f"Dropped {stats['frames_dropped']} frame(s) | Static {stats['frames_gated']} frame(s)")
+        if recognizer.tracker is not None:
+            print(f"   Encoded {recognizer.tracker.encodings_run} face(s), "
+                  f"skipped {recognizer.tracker.encodings_skipped} by tracking")
+        if recognizer.faces_rejected:
+            print(f"   Skipped {recognizer.faces_rejected} low-quality face(s) {recognizer.quality_breakdown()}")
+        print()
+        return len(self.attendance_marked)
+        
+    def recognize_faces_multi(self, sources):
+        """Start face recognition on several cameras"""
+        self.attendance_marked.clear()
+        
+        print(f"\n📹 Starting face recognition on {len(sources)} cameras...")
+        print("   Press 'q' to quit\n")
+        
+        pool = InferencePool(FaceRecognizer(self.matcher).analyze, config.INFERENCE_WORKERS) if config.INFERENCE_WORKERS > 1 else None
+        session = MultiCameraSession(sources, self.matcher, self.draw_results, 'Attendance System',
+                                     on_match=self.on_face_recognized, pool=pool,
+                                     gate_factory=MotionGate.from_config,
+                                     roi_factory=RegionsOfInterest.from_config,
+                                     display_fps=config.DISPLAY_FPS,
+                                     tile_width=config.MULTI_CAMERA_TILE_WIDTH,
+                                     show_metrics=config.SHOW_PIPELINE_METRICS)
+        try:
+            stats, camera_stats = session.run()
+        except ValueError as e:
+            print(f"✗ {e}\n")
+            return 0
+        finally:
+            cv2.destroyAllWindows()
+            if pool is not None:
+                pool.close()
                 
-                face_names = []
-                for face_encoding in face_encodings:
-                    matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                    name = "Unknown"
-                    
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    if len(face_distances) > 0:
-                        best_match_index = np.argmin(face_distances)
-                        if matches[best_match_index]:
-                            name = self.known_face_names[best_match_index]
-                            
-                            if self.mark_attendance(name):
-                                print(f"   ✓ Attendance marked for {name}")
-                                
-                    face_names.append(name)
-                    
-            for (top, right, bottom, left), name in zip(face_locations, face_names):
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
+        print(f"\n✓ Attendance complete! Marked: {len(self.attendance_marked)} student(s)")
+        for source, camera in zip(sources, camera_stats):
+            print(f"   Camera {source}: {camera['capture_fps']:.1f} FPS captured, "
+                  f"{camera['recognition_fps']:.1f} FPS recognised, {camera['latency_ms']:.0f} ms latency")
+        print(f"   Matched {stats['faces_matched']} face(s) in {stats['ticks']} batch(es), "
+              f"{stats['duplicates_suppressed']} cross-camera duplicate(s) suppressed\n")
+        return len(self.attendance_marked)
+        
+    def process_videos(self, video_paths):
+        """Recognise students in recorded videos without opening a window"""
+        totals = {'frames': 0, 'frames_processed': 0, 'faces': 0, 'seconds': 0.0}
+        
+        for video_path in video_paths:
+            print(f"\n🎞  Processing {video_path}...")
+            processor = VideoProcessor.from_config(
+                FaceRecognizer(self.matcher, roi=RegionsOfInterest.from_config(video_path)))
+            try:
+                attendance, stats = processor.process(
+                    video_path, lambda name, timestamp: print(f"   ✓ {name} at {format_timestamp(timestamp)}"))
+            except Exception as e:
+                print(f"   ✗ {e}")
+                continue
                 
-                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-                cv2.putText(frame, name, (left + 6, bottom - 6),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
-                           
-            cv2.putText(frame, f"Marked: {len(self.attendance_marked)}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.imshow('Attendance System', frame)
+            stem = os.path.splitext(os.path.basename(video_path))[0]
+            csv_file = os.path.join(config.ATTENDANCE_DIR, f'video_{stem}.csv')
+            write_attendance(video_path, attendance, csv_file)
             
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            print(f"   {len(attendance)} student(s) recognised -> {csv_file}")
+            print(f"   {stats['frames']} frames in {stats['seconds']:.1f}s: {stats['fps']:.1f} frames/s "
+                  f"({stats['speed']:.1f}x real time), {stats['processed_fps']:.1f} recognised frames/s, "
+                  f"{stats['faces_per_second']:.1f} faces/s")
+            for key in totals:
+                totals[key] += stats[key]
                 
-        cap.release()
-        cv2.destroyAllWindows()
-        
-        print(f"\n✓ Attendance complete! Marked: {len(self.attendance_marked)} student(s)\n")
-        return len(self.attendance_marked)
+        if len(video_paths) > 1 and totals['seconds'] > 0:
+            print(f"\n✓ {len(video_paths)} videos: {totals['frames'] / totals['seconds']:.1f} frames/s, "
+                  f"{totals['frames_processed'] / totals['seconds']:.1f} recognised frames/s, "
+                  f"{totals['faces'] / totals['seconds']:.1f} faces/s")
+        print()
+        return totals
         
     def view_attendance(self):
         """View today's attendance"""
         date_string = datetime.now().strftime('%Y-%m-%d')
-        filename = f'attendance_records/attendance_{date_string}.csv'
+        rows = self.attendance.day(date_string)
         
-        if not os.path.exists(filename):
+        if not rows:
             print("\n⚠ No attendance records for today\n")
             return
             
         print(f"\n📋 Attendance for {date_string}")
         print("=" * 60)
         
-        with open(filename, 'r') as f:
-            content = f.read()
-            print(content)
+        print("Name,Date,Time")
+        for row in rows:
+            print(",".join(row))
         print("=" * 60 + "\n")
         
+    def attendance_report(self, start_date, end_date):
+        """Summarise attendance between two dates and write the report CSVs"""
+        self.attendance.flush()
+        try:
+            # The writer's own log when attendance goes to SQLite, else the daily CSVs
+            log = self.attendance.log if config.ATTENDANCE_BACKEND == 'sqlite' else None
+            report = build_report(start_date, end_date, config.ATTENDANCE_DIR, config.REPORT_CACHE_DIR, log)
+        except ValueError as e:
+            print(f"\n✗ {e}\n")
+            return None
+            
+        students_file, daily_file = write_report(report, config.REPORTS_DIR)
+        print(f"\n📈 Attendance {start_date} to {end_date}")
+        print("=" * 60)
+        print(f"Session days: {report['session_days']}")
+        print(f"Students seen: {len(report['students'])}")
+        if report['students']:
+            mean_rate = sum(row[2] for row in report['students']) / len(report['students'])
+            print(f"Mean attendance rate: {mean_rate:.1%}")
+        if report['daily']:
+            print(f"Mean daily headcount: {sum(count for _, count in report['daily']) / len(report['daily']):.1f}")
+        print(f"Per-student report: {students_file}")
+        print(f"Daily headcounts: {daily_file}")
+        print("=" * 60 + "\n")
+        return report
+        
     def list_students(self):
         """List all registered students"""
         if not self.known_face_names:
@@ -236,15 +393,44 @@ def print_menu():
     print("2. Start Attendance Recognition")
     print("3. View Today's Attendance")
     print("4. List All Students")
-    print("5. Exit")
+    print("5. Bulk Import Students")
+    print("6. Rebuild Roster from Images")
+    print("7. Attendance Report")
+    print("8. Exit")
     print("\n" + "="*60)
 
 def main():
+    parser = argparse.ArgumentParser(description="Face recognition attendance system (command line)")
+    parser.add_argument('--video', nargs='+', metavar='FILE',
+                        help="process recorded video files headlessly and exit")
+    parser.add_argument('--report', nargs=2, metavar=('START', 'END'),
+                        help="write an attendance report for a date range (YYYY-MM-DD) and exit")
+    args = parser.parse_args()
+    
     system = FaceRecognitionCLI()
     
+    if args.report:
+        system.attendance_report(*args.report)
+        system.attendance.close()
+        system.attendance_index.close()
+        instrumentation.metrics.close()
+        system.store.close()
+        return
+        
+    if args.video:
+        if len(system.known_face_names) == 0:
+            print("\n⚠ No students registered! Add students first.\n")
+        else:
+            system.process_videos(args.video)
+        system.attendance.close()
+        system.attendance_index.close()
+        instrumentation.metrics.close()
+        system.store.close()
+        return
+        
     while True:
         print_menu()
-        choice = input("\nEnter your choice (1-5): ").strip()
+        choice = input("\nEnter your choice (1-8): ").strip()
         
         if choice == '1':
             name = input("\nEnter student name: ").strip()
@@ -269,6 +455,25 @@ def main():
             system.list_students()
             
         elif choice == '5':
+            archive_dir = input("\nEnter photo archive folder (name/*.jpg): ").strip()
+            if archive_dir:
+                system.bulk_import(archive_dir)
+            else:
+                print("\n✗ Invalid folder\n")
+                
+        elif choice == '6':
+            system.rebuild_roster()
+                
+        elif choice == '7':
+            start_date = input("\nStart date (YYYY-MM-DD): ").strip()
+            end_date = input("End date (YYYY-MM-DD, blank for today): ").strip() or datetime.now().strftime('%Y-%m-%d')
+            system.attendance_report(start_date, end_date)
+            
+        elif choice == '8':
+            system.attendance.close()
+            system.attendance_index.close()
+            instrumentation.metrics.close()
+            system.store.close()
             print("\n👋 Goodbye!\n")
             break
             
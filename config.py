@@ -2,20 +2,109 @@
 
 # Recognition Settings
 RECOGNITION_TOLERANCE = 0.6  # Lower value = stricter matching (0.4 to 0.7)
-PROCESS_EVERY_N_FRAMES = 2   # Process every nth frame (higher = faster but less accurate)
-FRAME_RESIZE_FACTOR = 0.25   # Resize factor for processing (0.25 = 25% of original)
+PROCESS_EVERY_N_FRAMES = 2   # Process every nth frame (starting point when scheduling is adaptive)
+FRAME_RESIZE_FACTOR = 0.25   # Resize factor for face detection (0.25 = 25% of original)
+ENCODE_FACE_PADDING = 0.25   # Margin around each face box, as a fraction of its size, in encoding crops
+ENCODE_MAX_FACE_SIZE = 200   # Full-resolution faces larger than this (pixels) are shrunk before encoding
+
+# Detector Settings
+DETECTOR_BACKEND = 'hog'     # 'hog' (dlib), 'haar'/'lbp' (OpenCV cascades), 'ssd' or 'yunet' (cv2.dnn)
+DETECTOR_UPSAMPLE = 1        # Times the 'hog' detector upsamples the frame (finds smaller faces, slower)
+DETECTOR_CONFIDENCE = 0.6    # Minimum score of an 'ssd' or 'yunet' detection
+CASCADE_SCALE_FACTOR = 1.1   # Pyramid step of the cascade detectors
+CASCADE_MIN_NEIGHBORS = 5    # Overlapping hits a cascade detection needs (higher = fewer false positives)
+CASCADE_MIN_SIZE = 20        # Smallest face the cascades look for, in resized-frame pixels
+HAAR_CASCADE_FILE = ''       # '' = haarcascade_frontalface_default.xml bundled with OpenCV
+LBP_CASCADE_FILE = 'models/lbpcascade_frontalface_improved.xml'
+SSD_PROTOTXT_FILE = 'models/deploy.prototxt'
+SSD_MODEL_FILE = 'models/res10_300x300_ssd_iter_140000.caffemodel'
+YUNET_MODEL_FILE = 'models/face_detection_yunet_2023mar.onnx'
+
+# Embedding Settings
+EMBEDDING_BACKEND = 'dlib'   # 'dlib' (ResNet via face_recognition) or 'sface' (OpenCV SFace, faster on CPU)
+DLIB_NUM_JITTERS = 1         # Re-sampled copies averaged per dlib encoding (higher = steadier, slower)
+DLIB_LANDMARKS = 'small'     # Landmarks used to align faces for dlib: 'small' (5-point) or 'large' (68-point)
+SFACE_MODEL_FILE = 'models/face_recognition_sface_2021dec.onnx'   # Aligned with YUNET_MODEL_FILE
+SFACE_TOLERANCE = 1.128      # Match distance for 'sface' (RECOGNITION_TOLERANCE applies to 'dlib')
+
+# Face Quality Settings
+QUALITY_GATING = True        # Skip faces unlikely to be recognised before encoding them
+QUALITY_MIN_FACE_SIZE = 40   # Smallest face side worth encoding, in full-frame pixels
+QUALITY_MIN_SHARPNESS = 25   # Minimum Laplacian variance of the face (lower = blurrier)
+QUALITY_MIN_BRIGHTNESS = 40  # Mean grey level range of a well-exposed face
+QUALITY_MAX_BRIGHTNESS = 220
+QUALITY_MAX_CLIPPED = 0.35   # Largest fraction of face pixels crushed to black or blown to white
+QUALITY_MAX_YAW = 50         # Largest head turn in degrees, estimated from the landmarks
+
+# Matcher Settings
+MATCHER_INDEX = 'brute'      # 'brute' (exact, fastest up to ~100k encodings) or 'ivf' (approximate, large rosters);
+                             # 'balltree' is exact but searches one face at a time and is slower than 'brute' in 128-d
+IVF_NPROBE = 16              # Cells searched per face by the 'ivf' index (higher = better recall, slower)
+TEMPLATE_CANDIDATES = 5      # Students reranked on all their templates after the centroid pass
+
+# Pipeline Settings
+PIPELINE_QUEUE_SIZE = 2      # Frames waiting for recognition; older frames are dropped
+DISPLAY_FPS = 30             # Display refresh rate, independent of recognition speed
+INFERENCE_WORKERS = 1        # Detection/encoding processes (1 = run on the pipeline's own thread)
+MAX_FRAME_BYTES = 1920 * 1080 * 3   # Size of each shared-memory frame slot for worker processes
+
+# Scheduling Settings
+ADAPTIVE_SCHEDULING = True   # Adjust PROCESS_EVERY_N_FRAMES to the measured inference latency
+TARGET_LATENCY_MS = 250      # Back off when recognition takes longer than this
+INFERENCE_CPU_BUDGET = 0.6   # Share of each worker's time recognition may use (0-1)
+MAX_PROCESS_EVERY_N_FRAMES = 15   # Never skip more frames than this
+SHOW_PIPELINE_METRICS = True # Draw recognition rate and cadence on the video
+
+# Instrumentation Settings
+METRICS_ENABLED = False      # Time every recognition stage (capture, detect, encode, match, ...)
+METRICS_WINDOW = 1024        # Recent samples per stage used for the p50/p95/p99 latencies
+METRICS_EXPORT_FILE = 'attendance_records/metrics.prom'   # Periodic export ('' = none)
+METRICS_EXPORT_FORMAT = 'prometheus'   # 'prometheus' (text exposition) or 'json'
+METRICS_EXPORT_SECONDS = 10  # Seconds between exports
+
+# Motion Gating Settings
+MOTION_GATING = True         # Skip face detection while the scene is static
+MOTION_THRESHOLD = 0.01      # Fraction of thumbnail pixels that must change
+MOTION_PIXEL_DELTA = 25      # Grey-level change that counts a pixel as changed
+MOTION_REFRESH_SECONDS = 5   # Force a detection at least this often
+MOTION_HOLD_SECONDS = 2      # Keep detecting this long after motion stops
+
+# Offline Video Settings
+OFFLINE_SAMPLE_SECONDS = 0.5 # Recognise one frame per this much source time in recorded videos
+OFFLINE_WORKERS = 0          # Detection processes for video files (0 = one per CPU core)
+
+# Tracking Settings
+TRACKING_ENABLED = True      # Track faces between frames and skip re-encoding identified ones
+TRACK_IOU_THRESHOLD = 0.3    # Minimum box overlap to continue a track
+TRACK_MAX_MISSED = 5         # Processed frames a track survives without a detection
+TRACK_CONFIRM_HITS = 2       # Consistent matches before a track keeps its label
+TRACK_REVERIFY_INTERVAL = 30 # Processed frames between re-verifications of a confirmed track
 
 # Student Registration Settings
 NUM_IMAGES_PER_STUDENT = 5   # Number of images to capture per student
+ENROL_MIN_IMAGE_SIDE = 400   # Archive photos are decoded at half size only if they stay this large
+ENROL_DETECT_UPSAMPLE = 0    # Detector upsampling for archive photos (faces fill ID photos)
 
 # Camera Settings
 CAMERA_INDEX = 0             # Camera device index (0, 1, 2, etc.)
+CAMERA_SOURCES = [CAMERA_INDEX]   # Recognition sources: device indices and/or video files
+MULTI_CAMERA_TILE_WIDTH = 640     # Width of each camera's tile when several are shown
+# Camera source -> regions faces are detected in, as (x, y, w, h) rectangles and/or
+# [(x, y), ...] polygons in frame pixels, e.g. {0: [(400, 0, 480, 720)]}; other sources use the whole frame
+CAMERA_ROIS = {}
 
 # File Paths
 STUDENTS_DIR = 'students_images'
 ATTENDANCE_DIR = 'attendance_records'
 ENCODINGS_DIR = 'encodings'
-ENCODINGS_FILE = 'encodings/face_encodings.pkl'
+ENCODINGS_FILE = 'encodings/face_encodings.pkl'   # Legacy pickle, migrated on first start
+ENCODING_STORE_DIR = 'encodings/store'            # Memory-mapped encoding store
+ENROLMENT_REPORTS_DIR = 'encodings/reports'       # Per-image results of bulk imports and rebuilds
+ENCODING_CACHE_DIR = 'encodings/cache'            # Encodings of enrolment photos by content hash
+
+# Encoding Store Settings
+JOURNAL_COMPACT_THRESHOLD = 1000   # Journal records before a background compaction
+JOURNAL_FSYNC = True               # fsync each journal append (crash-safe enrolment)
 
 # GUI Settings
 WINDOW_WIDTH = 500
@@ -24,5 +113,13 @@ THEME_COLOR = '#2c3e50'
 BUTTON_COLOR = '#3498db'
 
 # Attendance Settings
+ATTENDANCE_BACKEND = 'csv'   # 'csv' (one file per day) or 'sqlite' (indexed database)
+ATTENDANCE_DB = 'attendance_records/attendance.db'   # Database used by the 'sqlite' backend
+REPORT_CACHE_DIR = 'attendance_records/report_cache'   # Per-month columnar cache for reports
+REPORTS_DIR = 'attendance_records/reports'             # Where attendance reports are written
+ATTENDANCE_BATCH_SIZE = 32   # Marks written together by the background writer
+ATTENDANCE_FLUSH_MS = 200    # Longest a mark waits in the queue before it is written
+ATTENDANCE_FSYNC_MARKS = 32  # fsync after this many marks (0 = only by time)
+ATTENDANCE_FSYNC_MS = 1000   # fsync written marks at least this often (0 = only by count)
 DATE_FORMAT = '%Y-%m-%d'
 TIME_FORMAT = '%H:%M:%S'
@@ -0,0 +1,254 @@
+"""
+Content-hash encoding cache and incremental roster rebuild
+Remembers the encoding of every enrolment photo under the hash of its
+bytes, so rebuilding the roster from students_images only re-encodes
+new or changed files. The cache is tied to the encoding model and the
+detector settings and starts empty when either changes
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import config
+from bulk_enroll import encode_images, scan_archive, write_report
+from encoding_store import DEFAULT_MODEL, EncodingStore, ModelMismatchError
+from face_encoder import encoder_settings
+
+CACHE_VERSION = 1
+
+def file_hash(path):
+    """Hex digest of the file's contents"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class EncodingCache:
+    def __init__(self, directory, model=DEFAULT_MODEL, settings='', dim=128):
+        self.directory = directory
+        self.model = model
+        self.settings = settings
+        self.dim = dim
+        self.index_file = os.path.join(directory, 'index.json')
+        self.vectors_file = os.path.join(directory, 'encodings.npy')
+
+        # content hash -> (status, face count, row in the vectors matrix or -1)
+        self.entries = {}
+        # path -> (size, mtime_ns, content hash), so unchanged files are not re-read
+        self.files = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._new_vectors = []
+        self._dirty = False
+
+    def load(self):
+        """Read the cache from disk; a cache for another model or settings is ignored"""
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            vectors = np.load(self.vectors_file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable encoding cache: {e}")
+            return False
+        if (index.get('version') != CACHE_VERSION or index.get('model') != self.model
+                or index.get('settings') != self.settings):
+            return False
+
+        self.entries = {digest: tuple(entry) for digest, entry in index['entries'].items()}
+        self.files = {path: tuple(entry) for path, entry in index['files'].items()}
+        self._vectors = vectors.reshape(-1, self.dim)
+        return True
+
+    def file_digest(self, path):
+        """Content hash of path, reusing the cached one while size and mtime are unchanged"""
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = file_hash(path)
+        self.files[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        self._dirty = True
+        return digest
+
+    def get(self, digest):
+        """Cached (status, face count, encoding) for a content hash, or None"""
+        entry = self.entries.get(digest)
+        if entry is None:
+            return None
+        status, faces, row = entry
+        if row < 0:
+            return status, faces, None
+        if row < len(self._vectors):
+            return status, faces, self._vectors[row]
+        return status, faces, self._new_vectors[row - len(self._vectors)]
+
+    def put(self, digest, status, faces, encoding):
+        """Remember the result of encoding a photo"""
+        row = -1
+        if encoding is not None:
+            row = len(self._vectors) + len(self._new_vectors)
+            self._new_vectors.append(np.asarray(encoding, dtype=np.float32))
+        self.entries[digest] = (status, faces, row)
+        self._dirty = True
+
+    def retain(self, paths):
+        """Forget every file not in paths and every hash they no longer reference"""
+        paths = set(paths)
+        if set(self.files) - paths:
+            self.files = {path: entry for path, entry in self.files.items() if path in paths}
+            self._dirty = True
+        live = {entry[2] for entry in self.files.values()}
+        if set(self.entries) - live:
+            self.entries = {digest: entry for digest, entry in self.entries.items() if digest in live}
+            self._dirty = True
+
+    def save(self):
+        """Write the cache, dropping vectors that are no longer referenced"""
+        if not self._dirty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        vectors = self._vectors
+        if self._new_vectors:
+            vectors = np.vstack([vectors, np.stack(self._new_vectors)])
+
+        rows = []
+        entries = {}
+        for digest, (status, faces, row) in self.entries.items():
+            if row >= 0:
+                rows.append(row)
+                row = len(rows) - 1
+            entries[digest] = (status, faces, row)
+        vectors = np.ascontiguousarray(vectors[np.array(rows, dtype=np.int64)], dtype=np.float32)
+
+        # Vectors first: the index never points past the end of the matrix
+        self._write(self.vectors_file, lambda f: np.save(f, vectors), 'wb')
+        index = {
+            'version': CACHE_VERSION,
+            'model': self.model,
+            'settings': self.settings,
+            'entries': entries,
+            'files': self.files,
+        }
+        self._write(self.index_file, lambda f: json.dump(index, f), 'w')
+
+        self.entries = entries
+        self._vectors = vectors
+        self._new_vectors = []
+        self._dirty = False
+
+    @staticmethod
+    def _write(path, write, mode):
+        tmp = path + '.tmp'
+        with open(tmp, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+def rebuild_roster(store, students_dir=config.STUDENTS_DIR, cache_dir=config.ENCODING_CACHE_DIR,
+                   workers=None, upsample=1, report_file=None):
+    """Regenerate the roster from the photos under students_dir
+
+    Only photos whose contents are not in the cache are encoded. Students
+    with a folder are replaced by its photos; students enrolled without
+    one (e.g. by a bulk import) are kept. Returns a summary dict.
+    """
+    start = time.perf_counter()
+    cache = EncodingCache(cache_dir, model=store.model,
+                          settings=f"detector={config.DETECTOR_BACKEND};upsample={upsample};"
+                                   f"min_side={config.ENROL_MIN_IMAGE_SIDE};{encoder_settings()}",
+                          dim=store.dim)
+    cache.load()
+
+    items = scan_archive(students_dir) if os.path.isdir(students_dir) else []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        digests = list(executor.map(cache.file_digest, [path for _, path in items]))
+
+    # Identical photos are encoded once
+    missing = {}
+    for item, digest in zip(items, digests):
+        if cache.get(digest) is None and digest not in missing:
+            missing[digest] = item
+    digest_by_path = {path: digest for digest, (_, path) in missing.items()}
+    failed = {}
+    for name, path, status, faces, encoding in encode_images(list(missing.values()), workers, upsample):
+        # Errors are not cached so the photo is retried next time
+        if status.startswith('error'):
+            failed[digest_by_path[path]] = (status, faces, None)
+        else:
+            cache.put(digest_by_path[path], status, faces, encoding)
+
+    cache.retain([path for _, path in items])
+    cache.save()
+
+    encodings, names, report = [], [], []
+    for (name, path), digest in zip(items, digests):
+        status, faces, encoding = failed.get(digest) or cache.get(digest)
+        report.append((name, path, status, faces))
+        if encoding is not None:
+            encodings.append(encoding)
+            names.append(name)
+
+    kept = 0
+    dropped = []
+    archived = None
+    rebuilt = {name for name, _ in items}
+    if store.exists():
+        try:
+            old_encodings, _, old_names = store.load()
+            rows = [i for i, name in enumerate(old_names) if name not in rebuilt]
+            encodings.extend(np.asarray(old_encodings[rows], dtype=np.float32))
+            names.extend(old_names[i] for i in rows)
+            kept = len({old_names[i] for i in rows})
+        except ModelMismatchError as e:
+            # Another model's encodings cannot be mixed in; keep them aside instead of overwriting
+            archived = store.archive()
+            old_names = EncodingStore(archived, model=e.stored_model, dim=store.dim).load()[2]
+            dropped = sorted(set(old_names) - rebuilt)
+            print(f"{e}; previous roster moved to {archived}")
+        except Exception as e:
+            print(f"Existing roster not kept: {e}")
+
+    store.save(np.array(encodings, dtype=np.float32).reshape(-1, store.dim), names)
+
+    if report_file is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_file = os.path.join(config.ENROLMENT_REPORTS_DIR, f'rebuild_{stamp}.csv')
+    write_report(report, report_file)
+
+    statuses = [status for _, _, status, _ in report]
+    return {
+        'images': len(items),
+        'encoded': len(missing),
+        'cached': len(items) - len(missing),
+        'enrolled_images': statuses.count('ok'),
+        'rejected': len(items) - statuses.count('ok'),
+        'students': len(set(names)),
+        'kept_students': kept,
+        'dropped_students': dropped,
+        'archived_roster': archived,
+        'seconds': time.perf_counter() - start,
+        'report_file': report_file,
+    }
+
+if __name__ == "__main__":
+    store = EncodingStore.from_config()
+    summary = rebuild_roster(store, sys.argv[1] if len(sys.argv) > 1 else config.STUDENTS_DIR,
+                             workers=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    store.close()
+    print(f"Rebuilt roster of {summary['students']} students from {summary['images']} images "
+          f"({summary['encoded']} encoded, {summary['cached']} cached) in {summary['seconds']:.1f}s")
+    print(f"Rejected {summary['rejected']} images, kept {summary['kept_students']} students without photos")
+    if summary['dropped_students']:
+        print(f"Not re-encoded (no photos, still in {summary['archived_roster']}): "
+              f"{', '.join(summary['dropped_students'])}")
+    print(f"Report: {summary['report_file']}")
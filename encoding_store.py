@@ -0,0 +1,387 @@
+"""
+Memory-mapped encoding store
+Keeps the roster as a raw float32 .npy matrix that is opened with
+np.memmap, a names sidecar and a small JSON header, so startup only
+reads the header and pages are loaded when they are first touched
+
+Enrolments and deletions are appended to a write-ahead journal instead
+of rewriting the snapshot; a background compaction folds the journal
+into a fresh snapshot and switches to it with an atomic rename
+"""
+
+import json
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+import config
+from face_encoder import DLIB_MODEL, encoder_model
+
+STORE_FORMAT = 'face-encoding-store'
+STORE_VERSION = 1
+DEFAULT_MODEL = DLIB_MODEL
+
+JOURNAL_MAGIC = b'FEJ1'
+JOURNAL_ADD = 1
+JOURNAL_REMOVE = 2
+# magic, op, name length, payload length
+JOURNAL_RECORD = struct.Struct('<4sBHI')
+JOURNAL_CRC = struct.Struct('<I')
+
+class ModelMismatchError(ValueError):
+    """The store holds encodings from a different model than the one in use"""
+
+    def __init__(self, stored_model, model):
+        super().__init__(f"Store was built with model '{stored_model}', expected '{model}'")
+        self.stored_model = stored_model
+        self.model = model
+
+class EncodingStore:
+    def __init__(self, directory, model=DEFAULT_MODEL, dim=128, compact_threshold=1000, fsync=True):
+        self.directory = directory
+        self.model = model
+        self.dim = dim
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.header_file = os.path.join(directory, 'header.json')
+
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_generation = None
+        self._journal_records = 0
+        self._compaction = None
+
+    @classmethod
+    def from_config(cls, directory=config.ENCODING_STORE_DIR):
+        """Open the store for the configured embedding model"""
+        return cls(directory, model=encoder_model(), compact_threshold=config.JOURNAL_COMPACT_THRESHOLD,
+                   fsync=config.JOURNAL_FSYNC)
+
+    def exists(self):
+        """Check whether a snapshot has been written"""
+        return os.path.exists(self.header_file)
+
+    def read_header(self, check_model=True):
+        """Read and validate the store header"""
+        with open(self.header_file, 'r') as f:
+            header = json.load(f)
+        if header.get('format') != STORE_FORMAT:
+            raise ValueError(f"{self.header_file} is not an encoding store header")
+        if header.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported store version {header.get('version')}")
+        if header.get('dim') != self.dim:
+            raise ValueError(f"Store dimension {header.get('dim')} does not match expected {self.dim}")
+        if check_model and header.get('model') != self.model:
+            raise ModelMismatchError(header.get('model'), self.model)
+        return header
+
+    def _path(self, kind, generation):
+        extension = {'names': 'json', 'journal': 'log'}.get(kind, 'npy')
+        return os.path.join(self.directory, f'{kind}-{generation:06d}.{extension}')
+
+    def load(self, names=None):
+        """Open the roster; returns (encodings, norms, names)
+
+        encodings and norms are read-only memory maps unless journal
+        records had to be replayed on top of the snapshot. When names
+        is given only the matching rows are read from disk.
+        """
+        header = self.read_header()
+        encodings, norms, row_names = self._load_snapshot(header)
+
+        records = []
+        for generation in self._journal_generations(header['generation']):
+            records.extend(self._read_journal(self._path('journal', generation))[0])
+        if records:
+            encodings, norms, row_names = self._replay(encodings, norms, row_names, records)
+
+        if names is not None:
+            wanted = set(names)
+            rows = np.array([i for i, name in enumerate(row_names) if name in wanted], dtype=np.int64)
+            return encodings[rows], norms[rows], [row_names[i] for i in rows]
+        return encodings, norms, row_names
+
+    def _load_snapshot(self, header):
+        generation = header['generation']
+        with open(self._path('names', generation), 'r') as f:
+            row_names = json.load(f)
+
+        if header['count'] == 0:
+            empty = np.zeros((0, self.dim), dtype=np.float32)
+            return empty, np.zeros(0, dtype=np.float32), row_names
+
+        encodings = np.load(self._path('encodings', generation), mmap_mode='r')
+        norms = np.load(self._path('norms', generation), mmap_mode='r')
+        if len(encodings) != header['count'] or len(row_names) != header['count']:
+            raise ValueError("Encoding store is inconsistent with its header")
+        return encodings, norms, row_names
+
+    def _replay(self, encodings, norms, row_names, records):
+        """Apply journal records on top of a snapshot"""
+        keep = np.ones(len(row_names), dtype=bool)
+        snapshot_rows = {}
+        for row, name in enumerate(row_names):
+            snapshot_rows.setdefault(name, []).append(row)
+
+        added = []
+        for op, name, rows in records:
+            if op == JOURNAL_ADD:
+                added.append((name, rows))
+            else:
+                keep[snapshot_rows.pop(name, [])] = False
+                added = [(n, r) for n, r in added if n != name]
+
+        new_names = [name for name, keep_row in zip(row_names, keep) if keep_row]
+        parts = [np.asarray(encodings[keep], dtype=np.float32)]
+        for name, rows in added:
+            parts.append(rows)
+            new_names.extend([name] * len(rows))
+        encodings = np.ascontiguousarray(np.vstack(parts))
+        norms = np.einsum('ij,ij->i', encodings, encodings)
+        return encodings, norms, new_names
+
+    def save(self, encodings, names):
+        """Write a full snapshot and switch the header to it atomically"""
+        self.wait_for_compaction()
+        with self._lock:
+            previous = 0
+            if self.exists():
+                # Skip past any journal generations so none replay on top
+                generation = self.read_header(check_model=False)['generation']
+                previous = max(self._journal_generations(generation), default=generation)
+            self._close_journal()
+            self._write_snapshot(encodings, names, previous + 1)
+            self._journal_records = 0
+
+    def _write_snapshot(self, encodings, names, generation):
+        os.makedirs(self.directory, exist_ok=True)
+        encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+        if len(encodings) != len(names):
+            raise ValueError("Number of encodings and names must match")
+
+        self._write_npy(self._path('encodings', generation), encodings)
+        self._write_npy(self._path('norms', generation), np.einsum('ij,ij->i', encodings, encodings))
+        self._write_json(self._path('names', generation), list(names))
+
+        # The header is replaced last, so readers see either snapshot in full
+        self._write_json(self.header_file, {
+            'format': STORE_FORMAT,
+            'version': STORE_VERSION,
+            'model': self.model,
+            'dim': self.dim,
+            'dtype': 'float32',
+            'count': len(encodings),
+            'generation': generation,
+        })
+
+        self._remove_stale(generation)
+
+    def append_add(self, encodings, name):
+        """Journal the enrolment of one or more encodings under name"""
+        rows = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+        self._append([(JOURNAL_ADD, name, rows.tobytes())])
+
+    def append_remove(self, name):
+        """Journal the deletion of every encoding stored under name"""
+        self._append([(JOURNAL_REMOVE, name, b'')])
+
+    def append_batch(self, enrolments):
+        """Journal many (encodings, name) enrolments with a single fsync"""
+        records = []
+        for encodings, name in enrolments:
+            rows = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim))
+            records.append((JOURNAL_ADD, name, rows.tobytes()))
+        self._append(records)
+
+    def _append(self, records):
+        with self._lock:
+            if not self.exists():
+                self._write_snapshot(np.zeros((0, self.dim), dtype=np.float32), [], 1)
+            journal = self._open_journal()
+            for op, name, payload in records:
+                journal.write(self._encode_record(op, name, payload))
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+            self._journal_records += len(records)
+            should_compact = self._journal_records >= self.compact_threshold
+
+        if should_compact:
+            self.compact(background=True)
+
+    def _open_journal(self):
+        """Open the journal for appends, dropping any torn record at the tail"""
+        if self._journal is None:
+            generation = max(self._journal_generations(self.read_header()['generation']),
+                             default=self.read_header()['generation'])
+            path = self._path('journal', generation)
+            records, valid_length = self._read_journal(path)
+            self._journal = open(path, 'ab')
+            self._journal.truncate(valid_length)
+            self._journal.seek(valid_length)
+            self._journal_generation = generation
+            self._journal_records = len(records)
+        return self._journal
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._journal_generation = None
+
+    def compact(self, background=False):
+        """Fold the journal into a fresh snapshot
+
+        New appends go to the next generation's journal while the
+        snapshot is rebuilt, and the header switch is an atomic rename.
+        """
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return
+            if not self.exists():
+                return
+            self._open_journal()
+            frozen = self._journal_generation
+            self._close_journal()
+
+            # Later appends land in the next journal; load() replays both
+            # until the new snapshot's header is in place
+            next_path = self._path('journal', frozen + 1)
+            open(next_path, 'ab').close()
+            self._journal_records = 0
+
+        if background:
+            self._compaction = threading.Thread(target=self._compact, args=(frozen,), daemon=True)
+            self._compaction.start()
+        else:
+            self._compact(frozen)
+
+    def _compact(self, frozen):
+        header = self.read_header()
+        encodings, norms, names = self._load_snapshot(header)
+        records = []
+        for generation in self._journal_generations(header['generation']):
+            if generation <= frozen:
+                records.extend(self._read_journal(self._path('journal', generation))[0])
+        if records:
+            encodings, norms, names = self._replay(encodings, norms, names, records)
+
+        # Appends only touch the newer journal, so no lock is needed here
+        self._write_snapshot(encodings, names, frozen + 1)
+
+    def wait_for_compaction(self):
+        """Block until a running background compaction has finished"""
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        """Finish background work and close the journal"""
+        self.wait_for_compaction()
+        with self._lock:
+            self._close_journal()
+
+    def archive(self):
+        """Move the store aside, e.g. before re-encoding with another model; returns its new path"""
+        self.close()
+        stored_model = self.read_header(check_model=False).get('model', 'unknown')
+        target = f"{self.directory}-{''.join(c if c.isalnum() else '_' for c in stored_model)}"
+        if os.path.exists(target):
+            suffix = 2
+            while os.path.exists(f"{target}-{suffix}"):
+                suffix += 1
+            target = f"{target}-{suffix}"
+        os.replace(self.directory, target)
+        return target
+
+    def migrate_from_pickle(self, pickle_file):
+        """One-shot conversion of the legacy face_encodings.pkl file"""
+        # The pickle always held dlib encodings
+        if self.model != DEFAULT_MODEL:
+            raise ModelMismatchError(DEFAULT_MODEL, self.model)
+        with open(pickle_file, 'rb') as f:
+            data = pickle.load(f)
+        encodings = np.asarray(data['encodings'], dtype=np.float32).reshape(-1, self.dim)
+        self.save(encodings, data['names'])
+
+        # Keep the original file as a backup but stop it being picked up again
+        os.replace(pickle_file, pickle_file + '.migrated')
+        return len(data['names'])
+
+    def _journal_generations(self, snapshot_generation):
+        """Generations of journals that still apply on top of the snapshot"""
+        generations = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith('journal-') and filename.endswith('.log'):
+                generation = int(filename[len('journal-'):-len('.log')])
+                if generation >= snapshot_generation:
+                    generations.append(generation)
+        return sorted(generations)
+
+    def _encode_record(self, op, name, payload):
+        name_bytes = name.encode('utf-8')
+        body = JOURNAL_RECORD.pack(JOURNAL_MAGIC, op, len(name_bytes), len(payload)) + name_bytes + payload
+        return body + JOURNAL_CRC.pack(zlib.crc32(body))
+
+    def _read_journal(self, path):
+        """Return ([(op, name, rows)], valid_length); stops at a torn or corrupt tail"""
+        records = []
+        if not os.path.exists(path):
+            return records, 0
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + JOURNAL_RECORD.size <= len(data):
+            magic, op, name_length, payload_length = JOURNAL_RECORD.unpack_from(data, offset)
+            end = offset + JOURNAL_RECORD.size + name_length + payload_length
+            if magic != JOURNAL_MAGIC or end + JOURNAL_CRC.size > len(data):
+                break
+            (crc,) = JOURNAL_CRC.unpack_from(data, end)
+            if crc != zlib.crc32(data[offset:end]):
+                break
+
+            name_start = offset + JOURNAL_RECORD.size
+            name = data[name_start:name_start + name_length].decode('utf-8')
+            rows = np.frombuffer(data, dtype=np.float32, count=payload_length // 4,
+                                 offset=name_start + name_length).reshape(-1, self.dim)
+            records.append((op, name, rows))
+            offset = end + JOURNAL_CRC.size
+        return records, offset
+
+    def _remove_stale(self, current):
+        """Delete snapshot and journal files from older generations"""
+        for filename in os.listdir(self.directory):
+            kind, _, rest = filename.partition('-')
+            if kind not in ('encodings', 'norms', 'names', 'journal') or not rest[:6].isdigit():
+                continue
+            generation = int(rest[:6])
+            if generation < current:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    # Still memory-mapped on Windows; cleaned up by a later save
+                    pass
+
+    @staticmethod
+    def _write_npy(path, array):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
@@ -0,0 +1,125 @@
+"""
+Face analysis step shared by the GUI, the CLI and the worker processes
+Turns a BGR frame into face locations (in frame coordinates) and encodings:
+faces are detected on a downscaled copy of the frame, then encoded from
+padded full-resolution crops around each box by the configured encoder
+"""
+
+import cv2
+
+import config
+import instrumentation
+from face_detector import detector_from_config
+from face_encoder import encoder_from_config
+from face_quality import QualityGate
+
+# Created on first use, once per process (worker processes included)
+_detector = None
+_encoder = None
+_quality_gate = False
+
+def get_detector():
+    """The face detector selected in config.py"""
+    global _detector
+    if _detector is None:
+        _detector = detector_from_config()
+    return _detector
+
+def get_encoder():
+    """The embedding backend selected in config.py"""
+    global _encoder
+    if _encoder is None:
+        _encoder = encoder_from_config()
+    return _encoder
+
+def get_quality_gate():
+    """The pre-encoding quality gate from config.py, or None when it is off"""
+    global _quality_gate
+    if _quality_gate is False:
+        _quality_gate = QualityGate.from_config()
+    return _quality_gate
+
+def _small_rgb(frame, resize_factor):
+    with instrumentation.metrics.stage('preprocess'):
+        small_frame = cv2.resize(frame, (0, 0), fx=resize_factor, fy=resize_factor)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+def _locate(rgb_frame):
+    with instrumentation.metrics.stage('detect'):
+        return get_detector().detect(rgb_frame)
+
+def _face_crop(frame, location, padding, max_side, color):
+    """Padded region around a face in the encoder's colour order, and the face box inside it"""
+    top, right, bottom, left = location
+    pad_y, pad_x = int((bottom - top) * padding), int((right - left) * padding)
+    height, width = frame.shape[:2]
+    y0, y1 = max(top - pad_y, 0), min(bottom + pad_y, height)
+    x0, x1 = max(left - pad_x, 0), min(right + pad_x, width)
+    crop = frame[y0:y1, x0:x1]
+
+    # Encoders align faces to 112-150 px chips; larger crops only slow them down
+    scale = 1.0
+    side = max(bottom - top, right - left)
+    if max_side and side > max_side:
+        scale = max_side / side
+        crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    box = (int((top - y0) * scale), int((right - x0) * scale),
+           int((bottom - y0) * scale), int((left - x0) * scale))
+    if color == 'rgb':
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), box
+    return crop.copy(), box
+
+def _scale_locations(face_locations, scale):
+    return [(int(top * scale), int(right * scale), int(bottom * scale), int(left * scale))
+            for (top, right, bottom, left) in face_locations]
+
+def detect_faces(frame, resize_factor=config.FRAME_RESIZE_FACTOR, roi=None):
+    """Detect faces on a downscaled copy of frame, or of each region of roi; returns frame coordinates"""
+    if roi is not None:
+        return roi.detect(frame, lambda view: detect_faces(view, resize_factor))
+    face_locations = _locate(_small_rgb(frame, resize_factor))
+    return _scale_locations(face_locations, 1.0 / resize_factor)
+
+def encode_faces(frame, face_locations, padding=config.ENCODE_FACE_PADDING, max_side=config.ENCODE_MAX_FACE_SIZE,
+                 max_yaw=None):
+    """Encode the faces at the given frame coordinates from full-resolution crops
+
+    Given max_yaw, faces whose landmarks show a larger head turn are not
+    encoded and their entries in the returned list are None.
+    """
+    if not face_locations:
+        return []
+    encoder = get_encoder()
+    with instrumentation.metrics.stage('preprocess'):
+        crops = [_face_crop(frame, location, padding, max_side, encoder.color) for location in face_locations]
+    with instrumentation.metrics.stage('encode'):
+        return encoder.encode(crops, max_yaw=max_yaw)
+
+def encode_gated(frame, face_locations, gate):
+    """Encode the faces that pass the quality gate; returns (encodings, reasons)
+
+    A rejected face's encoding is None and its reason is one of
+    face_quality.REASONS. The reasons go back with the encodings so they
+    are counted by the caller, not in a worker process.
+    """
+    reasons = [None] * len(face_locations)
+    if gate is None:
+        return encode_faces(frame, face_locations), reasons
+    with instrumentation.metrics.stage('quality'):
+        reasons = [gate.check(frame, location) for location in face_locations]
+
+    encodings = [None] * len(face_locations)
+    keep = [i for i, reason in enumerate(reasons) if reason is None]
+    for i, encoding in zip(keep, encode_faces(frame, [face_locations[i] for i in keep], max_yaw=gate.max_yaw)):
+        encodings[i] = encoding
+        if encoding is None:
+            reasons[i] = 'profile'
+    return encodings, reasons
+
+def detect_and_encode(frame, resize_factor=config.FRAME_RESIZE_FACTOR, roi=None):
+    """Detect faces on a downscaled copy of frame and encode the ones that pass the quality gate
+
+    Returns (face_locations, encodings, reasons) as encode_gated() does.
+    """
+    face_locations = detect_faces(frame, resize_factor, roi)
+    return (face_locations, *encode_gated(frame, face_locations, get_quality_gate()))
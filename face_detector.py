@@ -0,0 +1,152 @@
+"""
+Interchangeable face detectors
+dlib HOG (through face_recognition), OpenCV Haar/LBP cascades and the
+cv2.dnn ResNet-SSD and YuNet networks on CPU. Every detector takes an RGB
+image and returns (top, right, bottom, left) boxes like face_recognition
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+import config
+
+def _clip_boxes(boxes, shape):
+    """(x, y, w, h) boxes to (top, right, bottom, left) inside the image"""
+    height, width = shape[:2]
+    locations = []
+    for x, y, w, h in boxes:
+        top, left = max(int(y), 0), max(int(x), 0)
+        bottom, right = min(int(y + h), height), min(int(x + w), width)
+        if bottom > top and right > left:
+            locations.append((top, right, bottom, left))
+    return locations
+
+def require_file(path, what):
+    """path, if the model file exists"""
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"{what} not found: {path!r} (see the model files in config.py)")
+    return path
+
+class HogDetector:
+    """dlib's HOG + linear SVM detector, as used by face_recognition"""
+    kind = 'hog'
+
+    def __init__(self, upsample=1, model='hog'):
+        # Imported here so the OpenCV backends work without dlib
+        import face_recognition
+        self._face_locations = face_recognition.face_locations
+        self.upsample = upsample
+        self.model = model
+
+    def detect(self, rgb_image):
+        return self._face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model=self.model)
+
+class CascadeDetector:
+    """OpenCV Haar or LBP cascade on the grayscale image"""
+    kind = 'cascade'
+
+    def __init__(self, cascade_file, scale_factor=1.1, min_neighbors=5, min_size=20):
+        if not hasattr(cv2, 'CascadeClassifier'):
+            # OpenCV 5 moved cascades to the contrib modules
+            raise ValueError("This OpenCV build has no CascadeClassifier (install opencv-contrib-python)")
+        self.classifier = cv2.CascadeClassifier(require_file(cascade_file, "Cascade file"))
+        if self.classifier.empty():
+            raise ValueError(f"Could not load cascade {cascade_file}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def detect(self, rgb_image):
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY))
+        boxes = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                                 minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return _clip_boxes(boxes, rgb_image.shape)
+
+class SsdDetector:
+    """OpenCV's ResNet-10 SSD face detector (Caffe) through cv2.dnn"""
+    kind = 'ssd'
+
+    def __init__(self, prototxt, model, confidence=0.5, input_size=300):
+        self.net = cv2.dnn.readNet(require_file(model, "SSD model"), require_file(prototxt, "SSD prototxt"))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        # The network was trained on BGR with these channel means
+        blob = cv2.dnn.blobFromImage(rgb_image, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= self.confidence]
+        corners = detections[:, 3:7] * np.array([width, height, width, height])
+        boxes = [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in corners]
+        return _clip_boxes(boxes, rgb_image.shape)
+
+class YuNetDetector:
+    """OpenCV's YuNet face detector (ONNX) through cv2.FaceDetectorYN"""
+    kind = 'yunet'
+
+    def __init__(self, model, score_threshold=0.6, nms_threshold=0.3, top_k=5000):
+        self.detector = cv2.FaceDetectorYN.create(require_file(model, "YuNet model"), "", (320, 320),
+                                                  score_threshold, nms_threshold, top_k)
+        self._input_size = (320, 320)
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        if self._input_size != (width, height):
+            self.detector.setInputSize((width, height))
+            self._input_size = (width, height)
+        _, faces = self.detector.detect(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        return _clip_boxes(faces[:, :4], rgb_image.shape)
+
+DETECTOR_TYPES = {
+    'hog': HogDetector,
+    'haar': CascadeDetector,
+    'lbp': CascadeDetector,
+    'ssd': SsdDetector,
+    'yunet': YuNetDetector,
+}
+
+def create_detector(kind='hog', **options):
+    """Create a detector by name ('hog', 'haar', 'lbp', 'ssd' or 'yunet')"""
+    if kind not in DETECTOR_TYPES:
+        raise ValueError(f"Unknown detector '{kind}', expected one of {sorted(DETECTOR_TYPES)}")
+    return DETECTOR_TYPES[kind](**options)
+
+def detector_options(kind):
+    """Constructor options for a detector from the settings in config.py"""
+    if kind == 'hog':
+        return {'upsample': config.DETECTOR_UPSAMPLE}
+    if kind in ('haar', 'lbp'):
+        cascade_file = config.HAAR_CASCADE_FILE if kind == 'haar' else config.LBP_CASCADE_FILE
+        if not cascade_file and kind == 'haar' and hasattr(cv2, 'data'):
+            # The frontal-face cascade that ships with opencv-python
+            cascade_file = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+        return {'cascade_file': cascade_file,
+                'scale_factor': config.CASCADE_SCALE_FACTOR,
+                'min_neighbors': config.CASCADE_MIN_NEIGHBORS,
+                'min_size': config.CASCADE_MIN_SIZE}
+    if kind == 'ssd':
+        return {'prototxt': config.SSD_PROTOTXT_FILE, 'model': config.SSD_MODEL_FILE,
+                'confidence': config.DETECTOR_CONFIDENCE}
+    if kind == 'yunet':
+        return {'model': config.YUNET_MODEL_FILE, 'score_threshold': config.DETECTOR_CONFIDENCE}
+    return {}
+
+def detector_from_config(kind=None):
+    """The detector selected by DETECTOR_BACKEND, falling back to HOG if it cannot be loaded"""
+    kind = kind or config.DETECTOR_BACKEND
+    try:
+        return create_detector(kind, **detector_options(kind))
+    except (OSError, ValueError, cv2.error) as e:
+        if kind == 'hog':
+            raise
+        print(f"Error loading '{kind}' face detector: {e}; using 'hog'")
+        return create_detector('hog', **detector_options('hog'))
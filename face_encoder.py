@@ -0,0 +1,157 @@
+"""
+Interchangeable face embedding backends
+dlib's ResNet (through face_recognition's models, with configurable
+jitters and 5- or 68-point landmarks) and OpenCV's FaceRecognizerSF
+(SFace, ONNX), which is several times faster per face on CPU. Every
+encoder turns (crop, (top, right, bottom, left) box) pairs into 128-d
+encodings compared by Euclidean distance, and names its model so
+encodings from different models are never mixed in one roster. Given
+max_yaw, faces whose landmarks show a larger head turn come back as None
+without running the network
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+import config
+from face_detector import require_file
+from face_quality import estimate_yaw
+
+DLIB_MODEL = 'dlib_face_recognition_resnet_model_v1'
+
+class DlibEncoder:
+    """face_recognition's ResNet-34 encoder, batched over a frame's faces"""
+    kind = 'dlib'
+    model = DLIB_MODEL
+    dim = 128
+    color = 'rgb'
+
+    def __init__(self, num_jitters=1, landmarks='small'):
+        # Imported here so the OpenCV backend works without dlib
+        import dlib
+        import face_recognition
+
+        if landmarks not in ('small', 'large'):
+            raise ValueError(f"Unknown landmark model '{landmarks}', expected 'small' or 'large'")
+        self._dlib = dlib
+        self._predictor = (face_recognition.api.pose_predictor_5_point if landmarks == 'small'
+                           else face_recognition.api.pose_predictor_68_point)
+        self._encoder = face_recognition.api.face_encoder
+        self.num_jitters = num_jitters
+        self.landmarks = landmarks
+
+    def _yaw(self, shape):
+        points = np.array([(point.x, point.y) for point in shape.parts()], dtype=np.float64)
+        if len(points) == 5:
+            # Two corners per eye, then the base of the nose
+            return estimate_yaw(points[0:2].mean(axis=0), points[2:4].mean(axis=0), points[4])
+        return estimate_yaw(points[36:42].mean(axis=0), points[42:48].mean(axis=0), points[30])
+
+    def encode(self, crops, max_yaw=None):
+        encodings = [None] * len(crops)
+        accepted = []
+        images = []
+        shapes = []
+        for i, (image, (top, right, bottom, left)) in enumerate(crops):
+            shape = self._predictor(image, self._dlib.rectangle(left, top, right, bottom))
+            if max_yaw is not None and self._yaw(shape) > max_yaw:
+                continue
+            landmarks = self._dlib.full_object_detections()
+            landmarks.append(shape)
+            accepted.append(i)
+            images.append(image)
+            shapes.append(landmarks)
+        if images:
+            descriptors = self._encoder.compute_face_descriptor(images, shapes, self.num_jitters)
+            for i, face in zip(accepted, descriptors):
+                encodings[i] = np.array(face[0])
+        return encodings
+
+class SFaceEncoder:
+    """OpenCV's SFace recognizer, aligned on YuNet landmarks found inside each crop"""
+    kind = 'sface'
+    dim = 128
+    color = 'bgr'
+
+    def __init__(self, model, aligner_model, score_threshold=0.5):
+        self.recognizer = cv2.FaceRecognizerSF.create(require_file(model, "SFace model"), "")
+        self.aligner = cv2.FaceDetectorYN.create(require_file(aligner_model, "YuNet model"), "", (320, 320),
+                                                 score_threshold, 0.3, 50)
+        self.model = sface_model(model)
+        # Faces the aligner missed, encoded from the plain resized box instead
+        self.unaligned = 0
+
+    def _landmarks(self, image, box):
+        """The YuNet detection in image that best overlaps box, or None"""
+        height, width = image.shape[:2]
+        self.aligner.setInputSize((width, height))
+        _, faces = self.aligner.detect(image)
+        if faces is None:
+            return None
+        top, right, bottom, left = box
+        centre = np.array([(left + right) / 2, (top + bottom) / 2])
+        distances = np.linalg.norm(faces[:, :2] + faces[:, 2:4] / 2 - centre, axis=1)
+        return faces[int(np.argmin(distances))]
+
+    def encode(self, crops, max_yaw=None):
+        encodings = []
+        for image, box in crops:
+            face = self._landmarks(image, box)
+            if face is not None and max_yaw is not None and estimate_yaw(face[4:6], face[6:8], face[8:10]) > max_yaw:
+                encodings.append(None)
+                continue
+            if face is not None:
+                aligned = self.recognizer.alignCrop(image, face)
+            else:
+                top, right, bottom, left = box
+                aligned = cv2.resize(image[top:bottom, left:right], (112, 112))
+                self.unaligned += 1
+            feature = self.recognizer.feature(aligned).reshape(-1)
+            # Unit length, so Euclidean distance follows SFace's cosine score
+            encodings.append(feature / max(float(np.linalg.norm(feature)), 1e-12))
+        return encodings
+
+ENCODER_TYPES = {
+    'dlib': DlibEncoder,
+    'sface': SFaceEncoder,
+}
+
+def sface_model(model_file):
+    """Model tag of an SFace ONNX file, e.g. 'sface:face_recognition_sface_2021dec'"""
+    return 'sface:' + os.path.splitext(os.path.basename(model_file))[0]
+
+def create_encoder(kind='dlib', **options):
+    """Create an encoder by name ('dlib' or 'sface')"""
+    if kind not in ENCODER_TYPES:
+        raise ValueError(f"Unknown embedding backend '{kind}', expected one of {sorted(ENCODER_TYPES)}")
+    return ENCODER_TYPES[kind](**options)
+
+def encoder_options(kind):
+    """Constructor options for an encoder from the settings in config.py"""
+    if kind == 'dlib':
+        return {'num_jitters': config.DLIB_NUM_JITTERS, 'landmarks': config.DLIB_LANDMARKS}
+    if kind == 'sface':
+        return {'model': config.SFACE_MODEL_FILE, 'aligner_model': config.YUNET_MODEL_FILE}
+    return {}
+
+def encoder_from_config():
+    """The encoder selected by EMBEDDING_BACKEND"""
+    return create_encoder(config.EMBEDDING_BACKEND, **encoder_options(config.EMBEDDING_BACKEND))
+
+def encoder_model():
+    """Model tag of the configured encoder, without loading it"""
+    if config.EMBEDDING_BACKEND == 'sface':
+        return sface_model(config.SFACE_MODEL_FILE)
+    return DLIB_MODEL
+
+def encoder_settings():
+    """Settings of the configured encoder that change its encodings"""
+    if config.EMBEDDING_BACKEND == 'sface':
+        return f"aligner={os.path.basename(config.YUNET_MODEL_FILE)}"
+    return f"jitters={config.DLIB_NUM_JITTERS};landmarks={config.DLIB_LANDMARKS}"
+
+def encoder_tolerance():
+    """Distance threshold for the configured encoder's encodings"""
+    return config.SFACE_TOLERANCE if config.EMBEDDING_BACKEND == 'sface' else config.RECOGNITION_TOLERANCE
@@ -0,0 +1,390 @@
+"""
+Nearest-neighbour indexes for face encodings
+Exact brute force, a ball tree and an IVF (coarse-quantized) index,
+all sharing the same row numbering as the roster lists
+Run directly for a recall-vs-latency report on a synthetic roster
+"""
+
+import heapq
+import sys
+import time
+
+import numpy as np
+
+def euclidean_distances(queries, matrix, norms):
+    """Distances between every query and every row, given the rows' squared norms"""
+    query_norms = np.einsum('ij,ij->i', queries, queries)
+
+    # |a - b|^2 = |a|^2 + |b|^2 - 2ab, computed as one GEMM for all queries
+    squared = query_norms[:, None] + norms[None, :] - 2.0 * (queries @ matrix.T)
+    np.maximum(squared, 0.0, out=squared)
+    return np.sqrt(squared, out=squared)
+
+class BruteForceIndex:
+    """Exact search over the whole roster with a single GEMM"""
+    kind = 'brute'
+
+    def __init__(self, dim=128):
+        self.dim = dim
+        self._data = np.zeros((0, dim), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def matrix(self):
+        return self._data[:self.size]
+
+    @property
+    def norms(self):
+        return self._norms[:self.size]
+
+    def build(self, encodings, norms=None):
+        """Replace the index contents with the given encodings
+
+        A float32 memory map is used in place without copying; pass the
+        precomputed squared norms to avoid touching every page up front.
+        """
+        data = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        self._data = np.ascontiguousarray(data)
+        if norms is None:
+            self._norms = np.einsum('ij,ij->i', self._data, self._data)
+        else:
+            self._norms = np.asarray(norms, dtype=np.float32)
+        self.size = len(self._data)
+        self._rebuild()
+
+    def add(self, encodings):
+        """Append encodings as new rows at the end of the roster"""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        start, end = self.size, self.size + len(rows)
+
+        # Grow geometrically so bulk enrolment stays amortised O(1) per row
+        if end > len(self._data):
+            capacity = max(end, 2 * len(self._data), 64)
+            data = np.zeros((capacity, self.dim), dtype=np.float32)
+            norms = np.zeros(capacity, dtype=np.float32)
+            data[:start] = self._data[:start]
+            norms[:start] = self._norms[:start]
+            self._data, self._norms = data, norms
+
+        self._data[start:end] = rows
+        self._norms[start:end] = np.einsum('ij,ij->i', rows, rows)
+        self.size = end
+        self._added(start, end)
+
+    def remove(self, rows):
+        """Delete rows; later rows shift down like a Python list"""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        self._data = np.ascontiguousarray(self.matrix[keep])
+        self._norms = self.norms[keep].copy()
+        self.size = len(self._data)
+        self._removed(keep)
+
+    def search(self, queries, k=2, max_distance=None):
+        """Return (indices, distances) of the k nearest rows for each query
+
+        Missing neighbours are reported as index -1 and distance inf.
+        Neighbours further than max_distance may be omitted by
+        approximate indexes.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(queries) == 0 or self.size == 0:
+            return indices, distances
+        self._search(queries, k, max_distance, indices, distances)
+        return indices, distances
+
+    def _search(self, queries, k, max_distance, indices, distances):
+        dist = euclidean_distances(queries, self.matrix, self.norms)
+        self._top_k(dist, np.arange(self.size), k, indices, distances)
+
+    def _rebuild(self):
+        pass
+
+    def _added(self, start, end):
+        pass
+
+    def _removed(self, keep):
+        pass
+
+    @staticmethod
+    def _top_k(dist, rows, k, indices, distances, out_rows=None):
+        """Write the k smallest entries of each row of dist into the outputs"""
+        out_rows = np.arange(len(dist)) if out_rows is None else out_rows
+        n = dist.shape[1]
+        kk = min(k, n)
+        if kk == 0:
+            return
+        part = np.argpartition(dist, kk - 1, axis=1)[:, :kk] if n > kk else np.tile(np.arange(n), (len(dist), 1))
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        order = np.argsort(part_dist, axis=1)
+        indices[out_rows, :kk] = rows[np.take_along_axis(part, order, axis=1)]
+        distances[out_rows, :kk] = np.take_along_axis(part_dist, order, axis=1)
+
+class BallTreeIndex(BruteForceIndex):
+    """Exact ball tree; prunes whole subtrees that lie beyond max_distance
+
+    Queries are searched one at a time, and 128-d encodings leave little to
+    prune, so this is slower than the batched brute-force scan; use 'ivf'
+    to speed up large rosters.
+    """
+    kind = 'balltree'
+
+    def __init__(self, dim=128, leaf_size=64):
+        super().__init__(dim)
+        self.leaf_size = leaf_size
+        self._nodes = []
+        self._pending = np.zeros(0, dtype=np.int64)
+
+    def _rebuild(self):
+        self._nodes = []
+        self._pending = np.zeros(0, dtype=np.int64)
+        if self.size == 0:
+            return
+
+        # Each node: [center, radius, rows or None, left, right]
+        data = self.matrix
+        stack = [(np.arange(self.size), None, 0)]
+        while stack:
+            rows, parent, side = stack.pop()
+            points = data[rows]
+            center = points.mean(axis=0)
+            radius = float(np.sqrt(((points - center) ** 2).sum(axis=1).max()))
+            node = [center, radius, None, -1, -1]
+            self._nodes.append(node)
+            node_id = len(self._nodes) - 1
+            if parent is not None:
+                self._nodes[parent][3 + side] = node_id
+
+            if len(rows) <= self.leaf_size:
+                node[2] = rows
+                continue
+
+            # Split along the direction between two far-apart points
+            far_a = points[np.argmax(((points - center) ** 2).sum(axis=1))]
+            far_b = points[np.argmax(((points - far_a) ** 2).sum(axis=1))]
+            projection = points @ (far_b - far_a)
+            order = np.argsort(projection)
+            half = len(rows) // 2
+            stack.append((rows[order[:half]], node_id, 0))
+            stack.append((rows[order[half:]], node_id, 1))
+
+    def _added(self, start, end):
+        # New rows are scanned linearly until the tree is rebuilt
+        self._pending = np.concatenate([self._pending, np.arange(start, end)])
+        if len(self._pending) > max(self.leaf_size, int(np.sqrt(self.size)) * 4):
+            self._rebuild()
+
+    def _removed(self, keep):
+        self._rebuild()
+
+    def _search(self, queries, k, max_distance, indices, distances):
+        data = self.matrix
+        norms = self.norms
+        bound = np.inf if max_distance is None else float(max_distance)
+
+        for q, query in enumerate(queries):
+            best = []  # max-heap of (-distance, row)
+            heap = [(0.0, 0)] if self._nodes else []
+            while heap:
+                lower, node_id = heapq.heappop(heap)
+                worst = -best[0][0] if len(best) == k else bound
+                if lower > min(worst, bound):
+                    break
+                center, radius, rows, left, right = self._nodes[node_id]
+                if rows is not None:
+                    self._push_rows(query, rows, data, norms, k, best)
+                    continue
+                for child in (left, right):
+                    c_center, c_radius = self._nodes[child][0], self._nodes[child][1]
+                    gap = float(np.sqrt(((query - c_center) ** 2).sum())) - c_radius
+                    heapq.heappush(heap, (max(gap, 0.0), child))
+
+            if len(self._pending):
+                self._push_rows(query, self._pending, data, norms, k, best)
+
+            for j, (neg_dist, row) in enumerate(sorted(best, reverse=True)):
+                indices[q, j] = row
+                distances[q, j] = -neg_dist
+
+    def _push_rows(self, query, rows, data, norms, k, best):
+        dist = euclidean_distances(query[None, :], data[rows], norms[rows])[0]
+        for d, row in zip(dist.tolist(), rows.tolist()):
+            if len(best) < k:
+                heapq.heappush(best, (-d, row))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, row))
+
+class IVFIndex(BruteForceIndex):
+    """Inverted-file index: k-means coarse cells, exact rerank inside nprobe cells"""
+    kind = 'ivf'
+
+    def __init__(self, dim=128, nlist=None, nprobe=16, train_iterations=10):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self._assign = np.zeros(0, dtype=np.int64)
+        self._lists = []
+        self._trained_size = 0
+
+    def _rebuild(self):
+        if self.size == 0:
+            self.centroids = np.zeros((0, self.dim), dtype=np.float32)
+            self._assign = np.zeros(0, dtype=np.int64)
+            self._lists = []
+            self._trained_size = 0
+            return
+        self._train()
+        self._assign = self._nearest_centroid(self.matrix)
+        self._rebuild_lists()
+
+    def _train(self):
+        """Fit coarse centroids with a few rounds of k-means on a sample"""
+        nlist = self.nlist or max(1, int(4 * np.sqrt(self.size)))
+        nlist = min(nlist, self.size)
+        rng = np.random.default_rng(0)
+        sample_size = min(self.size, max(nlist * 40, 10000))
+        sample = self.matrix[rng.choice(self.size, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assign = self._nearest_centroid(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        self.centroids = np.ascontiguousarray(centroids)
+        self._trained_size = self.size
+
+    def _nearest_centroid(self, points, centroids=None):
+        centroids = self.centroids if centroids is None else centroids
+        norms = np.einsum('ij,ij->i', centroids, centroids)
+        assign = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), 8192):
+            chunk = points[start:start + 8192]
+            assign[start:start + 8192] = np.argmin(norms[None, :] - 2.0 * (chunk @ centroids.T), axis=1)
+        return assign
+
+    def _rebuild_lists(self):
+        order = np.argsort(self._assign, kind='stable')
+        bounds = np.searchsorted(self._assign[order], np.arange(1, len(self.centroids)))
+        self._lists = np.split(order, bounds)
+
+    def _added(self, start, end):
+        if len(self.centroids) == 0 or self.size > 4 * self._trained_size:
+            self._rebuild()
+            return
+        assign = self._nearest_centroid(self.matrix[start:end])
+        self._assign = np.concatenate([self._assign, assign])
+        for cell in np.unique(assign):
+            new_rows = np.arange(start, end)[assign == cell]
+            self._lists[cell] = np.concatenate([self._lists[cell], new_rows])
+
+    def _removed(self, keep):
+        if self.size == 0:
+            self._rebuild()
+            return
+        self._assign = self._assign[keep]
+        self._rebuild_lists()
+
+    def _search(self, queries, k, max_distance, indices, distances):
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_dist = euclidean_distances(queries, self.centroids,
+                                        np.einsum('ij,ij->i', self.centroids, self.centroids))
+        if nprobe < len(self.centroids):
+            probes = np.argpartition(centroid_dist, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.tile(np.arange(len(self.centroids)), (len(queries), 1))
+
+        data = self.matrix
+        norms = self.norms
+        for q in range(len(queries)):
+            rows = np.concatenate([self._lists[cell] for cell in probes[q]])
+            if len(rows) == 0:
+                continue
+            dist = euclidean_distances(queries[q:q + 1], data[rows], norms[rows])
+            self._top_k(dist, rows, k, indices, distances, out_rows=np.array([q]))
+
+INDEX_TYPES = {
+    'brute': BruteForceIndex,
+    'balltree': BallTreeIndex,
+    'ivf': IVFIndex,
+}
+
+def create_index(kind='brute', dim=128, **options):
+    """Create an empty index by name ('brute', 'balltree' or 'ivf')"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](dim=dim, **options)
+
+def synthetic_roster(num_identities, num_queries, dim=128, seed=0):
+    """Clustered encodings that mimic the spread of real face encodings"""
+    rng = np.random.default_rng(seed)
+    roster = rng.normal(scale=0.09, size=(num_identities, dim)).astype(np.float32)
+    targets = rng.integers(0, num_identities, size=num_queries)
+    queries = roster[targets] + rng.normal(scale=0.025, size=(num_queries, dim)).astype(np.float32)
+    return roster, queries, targets
+
+def recall_latency_report(num_identities=100000, num_queries=500, tolerance=0.6, configs=None):
+    """Print recall@1 and per-face latency of each index against brute force"""
+    roster, queries, _ = synthetic_roster(num_identities, num_queries)
+    configs = configs or [
+        ('brute', {}),
+        ('balltree', {}),
+        ('ivf', {'nprobe': 1}),
+        ('ivf', {'nprobe': 4}),
+        ('ivf', {'nprobe': 8}),
+        ('ivf', {'nprobe': 16}),
+    ]
+
+    exact = create_index('brute')
+    exact.build(roster)
+    truth, truth_dist = exact.search(queries, k=1)
+    within = truth_dist[:, 0] <= tolerance
+
+    print(f"\n{'='*72}")
+    print(f"Recall vs latency - {num_identities} identities, {num_queries} queries")
+    print('='*72)
+    print(f"{'index':<22}{'build (s)':>12}{'recall@1':>12}{'ms/face':>12}{'batch ms/face':>14}")
+
+    results = []
+    for kind, options in configs:
+        index = create_index(kind, **options)
+        start = time.perf_counter()
+        index.build(roster)
+        build_time = time.perf_counter() - start
+
+        # Single-face latency, as in a sparse doorway frame
+        start = time.perf_counter()
+        found = np.empty(num_queries, dtype=np.int64)
+        for q in range(num_queries):
+            found[q] = index.search(queries[q:q + 1], k=2, max_distance=tolerance)[0][0, 0]
+        single_ms = (time.perf_counter() - start) * 1000 / num_queries
+
+        # Whole batch at once, as in a crowded frame
+        start = time.perf_counter()
+        index.search(queries, k=2, max_distance=tolerance)
+        batch_ms = (time.perf_counter() - start) * 1000 / num_queries
+
+        recall = float(np.mean(found[within] == truth[within, 0])) if within.any() else 1.0
+        label = kind + ''.join(f" {k}={v}" for k, v in options.items())
+        print(f"{label:<22}{build_time:>12.2f}{recall:>12.4f}{single_ms:>12.3f}{batch_ms:>14.3f}")
+        results.append({'index': kind, 'options': options, 'build_s': build_time,
+                         'recall': recall, 'ms_per_face': single_ms, 'batch_ms_per_face': batch_ms})
+
+    print('='*72 + "\n")
+    return results
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    recall_latency_report(size)
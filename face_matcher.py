@@ -0,0 +1,157 @@
+"""
+Vectorized face matcher
+Keeps every captured encoding as a row of one contiguous float32 matrix,
+tagged with the student it belongs to. Faces are matched in two stages:
+candidate students are picked by centroid distance in one vectorized
+pass, then reranked on their full sets of templates
+"""
+
+import numpy as np
+
+import config
+from face_encoder import encoder_tolerance
+from face_index import BruteForceIndex, create_index, euclidean_distances
+
+class FaceMatcher:
+    def __init__(self, encodings=None, names=None, tolerance=0.6, index='brute', norms=None,
+                 candidates=5, **index_options):
+        self.tolerance = tolerance
+        self.candidates = candidates
+        self.templates = BruteForceIndex()
+        self.index = create_index(index, **index_options) if isinstance(index, str) else index
+        self.build(encodings, names, norms)
+
+    @classmethod
+    def from_config(cls, encodings=None, names=None, norms=None):
+        """Create a matcher using the tolerance and index settings in config.py"""
+        options = {'nprobe': config.IVF_NPROBE} if config.MATCHER_INDEX == 'ivf' else {}
+        return cls(encodings, names, tolerance=encoder_tolerance(),
+                   index=config.MATCHER_INDEX, norms=norms,
+                   candidates=config.TEMPLATE_CANDIDATES, **options)
+
+    def __len__(self):
+        return len(self.students)
+
+    @property
+    def matrix(self):
+        return self.templates.matrix
+
+    @property
+    def norms(self):
+        return self.templates.norms
+
+    def build(self, encodings, names, norms=None):
+        """Replace the roster; names labels each row of encodings"""
+        self.names = list(names) if names is not None else []
+        if encodings is None or len(encodings) == 0:
+            encodings, norms = np.zeros((0, self.templates.dim), dtype=np.float32), None
+        self.templates.build(encodings, norms)
+
+        rows_by_student = {}
+        for row, name in enumerate(self.names):
+            rows_by_student.setdefault(name, []).append(row)
+        self.students = list(rows_by_student)
+        self._rows = {name: np.array(rows, dtype=np.int64) for name, rows in rows_by_student.items()}
+
+        if len(self.students) == len(self.names):
+            # One template per student: the rows are their own centroids
+            self.index.build(self.templates.matrix, self.templates.norms)
+            self._radii = np.zeros(len(self.students), dtype=np.float32)
+            return
+
+        owners = np.empty(len(self.names), dtype=np.int64)
+        for student, name in enumerate(self.students):
+            owners[self._rows[name]] = student
+        order = np.argsort(owners, kind='stable')
+        starts = np.searchsorted(owners[order], np.arange(len(self.students)))
+        counts = np.bincount(owners, minlength=len(self.students))
+
+        grouped = np.asarray(self.templates.matrix[order], dtype=np.float32)
+        centroids = np.add.reduceat(grouped, starts, axis=0) / counts[:, None]
+        spread = np.linalg.norm(grouped - centroids[owners[order]], axis=1)
+        self._radii = np.maximum.reduceat(spread, starts).astype(np.float32)
+        self.index.build(centroids.astype(np.float32))
+
+    def add(self, encodings, name):
+        """Add one or more template encodings for a student"""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, self.templates.dim)
+        start = self.templates.size
+        self.templates.add(rows)
+        self.names.extend([name] * len(rows))
+
+        new_rows = np.arange(start, start + len(rows))
+        if name in self._rows:
+            self._drop_student(name)
+            new_rows = np.concatenate([self._rows[name], new_rows])
+        self._rows[name] = new_rows
+
+        templates = self.templates.matrix[new_rows]
+        centroid = templates.mean(axis=0)
+        self.index.add(centroid)
+        self.students.append(name)
+        self._radii = np.append(self._radii, np.linalg.norm(templates - centroid, axis=1).max())
+
+    def remove_name(self, name):
+        """Remove every encoding stored under name; returns how many were removed"""
+        if name not in self._rows:
+            return 0
+        rows = self._rows.pop(name)
+        self.templates.remove(rows)
+        self.names = [n for n in self.names if n != name]
+        self._drop_student(name)
+
+        # Later rows shift down past the removed ones
+        for student, student_rows in self._rows.items():
+            self._rows[student] = student_rows - np.searchsorted(rows, student_rows)
+        return len(rows)
+
+    def _drop_student(self, name):
+        position = self.students.index(name)
+        self.index.remove(position)
+        del self.students[position]
+        self._radii = np.delete(self._radii, position)
+
+    def distances(self, face_encodings):
+        """Euclidean distances between each face and every known template"""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.templates.dim)
+        return euclidean_distances(queries, self.matrix, self.norms)
+
+    def match(self, face_encodings):
+        """Return best student index, distance and margin to the runner-up for each face"""
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.templates.dim)
+        num_faces = len(queries)
+        best_index = np.full(num_faces, -1, dtype=np.int64)
+        best_distance = np.full(num_faces, np.inf, dtype=np.float32)
+        margin = np.full(num_faces, np.inf, dtype=np.float32)
+        if num_faces == 0 or not self.students:
+            return best_index, best_distance, margin
+
+        # Stage 1: candidate students by centroid distance. A template within
+        # tolerance is never further than tolerance + radius from its centroid.
+        k = min(self.candidates, len(self.students))
+        bound = self.tolerance + float(self._radii.max())
+        candidates, _ = self.index.search(queries, k=k, max_distance=bound)
+        candidates = np.unique(candidates[candidates >= 0])
+        if len(candidates) == 0:
+            return best_index, best_distance, margin
+
+        # Stage 2: rerank on every template of the candidates in one GEMM
+        rows = [self._rows[self.students[student]] for student in candidates]
+        starts = np.cumsum([0] + [len(r) for r in rows[:-1]])
+        rows = np.concatenate(rows)
+        dist = euclidean_distances(queries, self.templates.matrix[rows], self.templates.norms[rows])
+        per_student = np.minimum.reduceat(dist, starts, axis=1)
+
+        order = np.argsort(per_student, axis=1)
+        faces = np.arange(num_faces)
+        best_index[:] = candidates[order[:, 0]]
+        best_distance[:] = per_student[faces, order[:, 0]]
+        if per_student.shape[1] > 1:
+            margin[:] = per_student[faces, order[:, 1]] - best_distance
+        return best_index, best_distance, margin
+
+    def identify(self, face_encodings):
+        """Return the matched name (or "Unknown") for each face"""
+        best_index, best_distance, _ = self.match(face_encodings)
+        return [self.students[i] if i >= 0 and d <= self.tolerance else "Unknown"
+                for i, d in zip(best_index, best_distance)]
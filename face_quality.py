@@ -0,0 +1,77 @@
+"""
+Pre-encoding face quality gate
+Drops faces that would only come back "Unknown" before they reach the
+encoder: boxes too small to recognise, motion-blurred faces (low Laplacian
+variance), under- or over-exposed faces and faces turned too far to the
+side, judged from the landmarks the encoder aligns with
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+import config
+
+REASONS = ('small', 'blurry', 'exposure', 'profile')
+
+# Side length of the grey thumbnail blur and exposure are measured on
+THUMBNAIL_SIZE = 64
+
+# Nose depth in front of the eyes, in inter-eye distances
+NOSE_DEPTH = 0.6
+
+def estimate_yaw(eye_a, eye_b, nose):
+    """Head yaw in degrees (0 = frontal) from two eye centres and the nose"""
+    eye_a, eye_b, nose = (np.asarray(point, dtype=np.float64) for point in (eye_a, eye_b, nose))
+    eye_distance = float(np.linalg.norm(eye_b - eye_a))
+    if eye_distance < 1e-6:
+        return 90.0
+    # The nose moves sideways from the eye midpoint as the head turns,
+    # while the projected eye distance shrinks: offset = depth * tan(yaw)
+    offset = abs(float(nose[0] - (eye_a[0] + eye_b[0]) / 2))
+    return math.degrees(math.atan2(offset, eye_distance * NOSE_DEPTH))
+
+class QualityGate:
+    def __init__(self, min_face_size=40, min_sharpness=25.0, min_brightness=40, max_brightness=220,
+                 max_clipped=0.35, max_yaw=50):
+        self.min_face_size = min_face_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        # Passed to the encoder, which checks it on its own landmarks
+        self.max_yaw = max_yaw
+
+    @classmethod
+    def from_config(cls):
+        """Create a gate from config.py, or None when quality gating is off"""
+        if not config.QUALITY_GATING:
+            return None
+        return cls(min_face_size=config.QUALITY_MIN_FACE_SIZE,
+                   min_sharpness=config.QUALITY_MIN_SHARPNESS,
+                   min_brightness=config.QUALITY_MIN_BRIGHTNESS,
+                   max_brightness=config.QUALITY_MAX_BRIGHTNESS,
+                   max_clipped=config.QUALITY_MAX_CLIPPED,
+                   max_yaw=config.QUALITY_MAX_YAW)
+
+    def check(self, frame, location):
+        """The reason to skip the face at location, or None if it is worth encoding"""
+        top, right, bottom, left = location
+        if min(bottom - top, right - left) < self.min_face_size:
+            return 'small'
+
+        face = frame[max(top, 0):bottom, max(left, 0):right]
+        if face.size == 0:
+            return 'small'
+        thumbnail = cv2.cvtColor(cv2.resize(face, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+
+        brightness = float(thumbnail.mean())
+        clipped = np.count_nonzero((thumbnail < 8) | (thumbnail > 247)) / thumbnail.size
+        if not self.min_brightness <= brightness <= self.max_brightness or clipped > self.max_clipped:
+            return 'exposure'
+
+        if cv2.Laplacian(thumbnail, cv2.CV_64F).var() < self.min_sharpness:
+            return 'blurry'
+        return None
@@ -0,0 +1,125 @@
+"""
+Face tracking between detections
+Associates each detected box with a track (IoU first, centroid distance
+as a fallback) so a face that has been confidently identified keeps its
+label and only needs re-encoding for a periodic re-verify
+"""
+
+import numpy as np
+
+def box_iou(boxes_a, boxes_b):
+    """IoU between every pair of (top, right, bottom, left) boxes, as an len(a) x len(b) matrix"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    right = np.minimum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    bottom = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    left = np.maximum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+
+    def area(b):
+        return (b[..., 1] - b[..., 3]) * (b[..., 2] - b[..., 0])
+    union = area(boxes_a)[:, None] + area(boxes_b)[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+class Track:
+    def __init__(self, track_id, box, frame_index):
+        self.id = track_id
+        self.box = box
+        self.name = "Unknown"
+        self.hits = 0
+        self.missed = 0
+        self.first_seen = frame_index
+        self.last_encoded = None
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_missed=5, confirm_hits=2,
+                 reverify_interval=30, unknown_retry_interval=3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.confirm_hits = confirm_hits
+        self.reverify_interval = reverify_interval
+        self.unknown_retry_interval = unknown_retry_interval
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_id = 1
+        self.encodings_run = 0
+        self.encodings_skipped = 0
+
+    def update(self, boxes):
+        """Associate detected (top, right, bottom, left) boxes with tracks
+
+        Returns the track for each box, creating tracks for new faces and
+        dropping tracks that have not been seen for max_missed frames.
+        """
+        self.frame_index += 1
+        assigned = [None] * len(boxes)
+        matched_tracks = set()
+
+        if self.tracks and boxes:
+            scores = self._association_scores(np.array([t.box for t in self.tracks], dtype=np.float32),
+                                              np.array(boxes, dtype=np.float32))
+            # Greedy assignment, best-overlapping pairs first
+            for flat in np.argsort(-scores, axis=None):
+                t, b = np.unravel_index(flat, scores.shape)
+                if scores[t, b] < self.iou_threshold:
+                    break
+                if t in matched_tracks or assigned[b] is not None:
+                    continue
+                matched_tracks.add(t)
+                assigned[b] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for b, box in enumerate(boxes):
+            if assigned[b] is None:
+                track = Track(self._next_id, box, self.frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[b] = track
+            else:
+                assigned[b].box = box
+                assigned[b].missed = 0
+        return assigned
+
+    def _association_scores(self, track_boxes, boxes):
+        """IoU between every track and box, with a centroid fallback for fast movers"""
+        iou = box_iou(track_boxes, boxes)
+
+        # A box whose centre stays within half a face width still counts as
+        # the same track, scored just at the threshold so real overlaps win
+        track_centers = np.stack([(track_boxes[:, 0] + track_boxes[:, 2]) / 2,
+                                  (track_boxes[:, 1] + track_boxes[:, 3]) / 2], axis=1)
+        centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        shift = np.linalg.norm(track_centers[:, None, :] - centers[None, :, :], axis=2)
+        width = (track_boxes[:, 1] - track_boxes[:, 3])[:, None]
+        near = shift < 0.5 * width
+        return np.where((iou < self.iou_threshold) & near, self.iou_threshold, iou)
+
+    def is_confirmed(self, track):
+        """A track is confirmed after the same known name was matched confirm_hits times"""
+        return track.name != "Unknown" and track.hits >= self.confirm_hits
+
+    def needs_encoding(self, track):
+        """Whether the face must be (re-)encoded on this frame"""
+        if track.last_encoded is None:
+            return True
+        age = self.frame_index - track.last_encoded
+        if self.is_confirmed(track):
+            return age >= self.reverify_interval
+        if track.name == "Unknown":
+            return age >= self.unknown_retry_interval
+        return True
+
+    def record(self, track, name):
+        """Store the result of encoding and matching a tracked face"""
+        track.last_encoded = self.frame_index
+        if name == track.name and name != "Unknown":
+            track.hits += 1
+        else:
+            track.name = name
+            track.hits = 1 if name != "Unknown" else 0
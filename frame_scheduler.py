@@ -0,0 +1,110 @@
+"""
+Adaptive frame scheduling
+Chooses how many captured frames to skip between recognitions so that
+inference stays within a CPU budget and a target latency, backing off
+under load and speeding up when new faces appear
+"""
+
+import math
+import time
+
+import config
+
+class FrameScheduler:
+    def __init__(self, every_n=2, adaptive=True, target_latency=0.25, cpu_budget=0.6, workers=1,
+                 min_every_n=1, max_every_n=15, burst_frames=15, smoothing=0.2):
+        self.every_n = every_n
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.cpu_budget = cpu_budget
+        self.workers = workers
+        self.min_every_n = min_every_n
+        self.max_every_n = max_every_n
+        self.burst_frames = burst_frames
+        self.smoothing = smoothing
+
+        self._frame_counter = 0
+        self._burst_remaining = 0
+        self._last_face_count = 0
+        self._last_frame_time = None
+        self._last_result_time = None
+        self.frame_interval = None
+        self.result_interval = None
+        self.latency = None
+
+    @classmethod
+    def from_config(cls, workers=1):
+        """Create a scheduler from the settings in config.py"""
+        return cls(every_n=config.PROCESS_EVERY_N_FRAMES,
+                   adaptive=config.ADAPTIVE_SCHEDULING,
+                   target_latency=config.TARGET_LATENCY_MS / 1000.0,
+                   cpu_budget=config.INFERENCE_CPU_BUDGET,
+                   workers=workers,
+                   max_every_n=config.MAX_PROCESS_EVERY_N_FRAMES)
+
+    def _smooth(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def should_process(self):
+        """Called for every captured frame; returns True if it should be recognised"""
+        now = time.perf_counter()
+        if self._last_frame_time is not None:
+            self.frame_interval = self._smooth(self.frame_interval, now - self._last_frame_time)
+        self._last_frame_time = now
+
+        if self._burst_remaining > 0:
+            self._burst_remaining -= 1
+            if self._burst_remaining == 0:
+                self._adapt()
+
+        self._frame_counter += 1
+        if self._frame_counter >= self.every_n:
+            self._frame_counter = 0
+            return True
+        return False
+
+    def record(self, latency, face_count):
+        """Report a finished recognition: its latency in seconds and faces found"""
+        now = time.perf_counter()
+        if self._last_result_time is not None:
+            self.result_interval = self._smooth(self.result_interval, now - self._last_result_time)
+        self._last_result_time = now
+        self.latency = self._smooth(self.latency, latency)
+
+        # New faces in view: recognise every frame for a while
+        if face_count > self._last_face_count:
+            self._burst_remaining = self.burst_frames
+        self._last_face_count = face_count
+        self._adapt()
+
+    def _adapt(self):
+        if not self.adaptive or self.latency is None or not self.frame_interval:
+            return
+        if self._burst_remaining > 0:
+            self.every_n = self.min_every_n
+            return
+
+        # Fraction of the workers' time inference may use at this cadence
+        camera_fps = 1.0 / self.frame_interval
+        desired = math.ceil(self.latency * camera_fps / (self.cpu_budget * self.workers))
+
+        # Over the latency target: back off one step further
+        if self.latency > self.target_latency:
+            desired = max(desired, self.every_n + 1)
+        self.every_n = max(self.min_every_n, min(self.max_every_n, desired))
+
+    def metrics(self):
+        """Live scheduling metrics"""
+        camera_fps = 1.0 / self.frame_interval if self.frame_interval else 0.0
+        recognition_fps = 1.0 / self.result_interval if self.result_interval else 0.0
+        latency = self.latency or 0.0
+        return {
+            'every_n': self.every_n,
+            'camera_fps': camera_fps,
+            'recognition_fps': recognition_fps,
+            'latency_ms': latency * 1000,
+            'cpu_load': min(1.0, latency * recognition_fps / self.workers),
+            'burst': self._burst_remaining > 0,
+        }
@@ -0,0 +1,194 @@
+"""
+Per-stage latency instrumentation
+Rolling latency histograms (p50/p95/p99) for each stage of recognition
+and counters for faces, matches and unknowns, exported periodically to
+a JSON or Prometheus text file
+
+Code reports through the module-level `metrics` object, which is a
+no-op until configure() enables it, so disabled instrumentation costs
+one attribute lookup and an empty context manager per stage
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import config
+
+PERCENTILES = (50, 95, 99)
+
+class RollingHistogram:
+    """The last `window` samples of a latency, plus lifetime count and sum"""
+
+    def __init__(self, window=1024):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self._samples[self.count % len(self._samples)] = value
+        self.count += 1
+        self.total += value
+
+    def percentiles(self):
+        recent = self._samples[:min(self.count, len(self._samples))]
+        if len(recent) == 0:
+            return {p: 0.0 for p in PERCENTILES}
+        return dict(zip(PERCENTILES, np.percentile(recent, PERCENTILES).tolist()))
+
+class _StageTimer:
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class NullMetrics:
+    """Stand-in used while instrumentation is disabled"""
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_TIMER
+
+    def observe(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def close(self):
+        pass
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, window=1024, export_file=None, export_format='prometheus', export_interval=10.0):
+        self.window = window
+        self.export_file = export_file
+        self.export_format = export_format
+        self.export_interval = export_interval
+
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._stop = threading.Event()
+        self._exporter = None
+        if export_file:
+            self._exporter = threading.Thread(target=self._export_loop, daemon=True)
+            self._exporter.start()
+
+    def stage(self, name):
+        """Context manager timing one run of a stage"""
+        return _StageTimer(self, name)
+
+    def observe(self, name, seconds):
+        """Record a stage latency in seconds"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1):
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Percentiles (ms), counts and totals of every stage, and every counter"""
+        with self._lock:
+            stages = {name: {'count': histogram.count,
+                             'total_s': histogram.total,
+                             **{f'p{p}_ms': value * 1000 for p, value in histogram.percentiles().items()}}
+                      for name, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+        return {'timestamp': time.time(), 'uptime_s': time.time() - self._started,
+                'stages': stages, 'counters': counters}
+
+    def prometheus_text(self, snapshot=None):
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = snapshot or self.snapshot()
+        lines = ['# HELP attendance_stage_seconds Recognition stage latency over the recent window',
+                 '# TYPE attendance_stage_seconds summary']
+        for name, stage in sorted(snapshot['stages'].items()):
+            for p in PERCENTILES:
+                lines.append(f'attendance_stage_seconds{{stage="{name}",quantile="{p / 100}"}} '
+                             f'{stage[f"p{p}_ms"] / 1000:.6f}')
+            lines.append(f'attendance_stage_seconds_sum{{stage="{name}"}} {stage["total_s"]:.6f}')
+            lines.append(f'attendance_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE attendance_{name}_total counter')
+            lines.append(f'attendance_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path=None):
+        """Write the current snapshot to the export file, replacing it atomically"""
+        path = path or self.export_file
+        snapshot = self.snapshot()
+        if self.export_format == 'json':
+            text = json.dumps(snapshot, indent=2)
+        else:
+            text = self.prometheus_text(snapshot)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def _export_loop(self):
+        while not self._stop.wait(self.export_interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error exporting metrics: {e}")
+
+    def close(self):
+        """Stop the exporter after a final export"""
+        if self._exporter is not None and not self._stop.is_set():
+            self._stop.set()
+            self._exporter.join()
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error exporting metrics: {e}")
+
+metrics = NullMetrics()
+
+def configure(enabled=None):
+    """Enable or disable instrumentation using the settings in config.py"""
+    global metrics
+    enabled = config.METRICS_ENABLED if enabled is None else enabled
+    metrics.close()
+    if enabled:
+        metrics = Metrics(window=config.METRICS_WINDOW,
+                          export_file=config.METRICS_EXPORT_FILE,
+                          export_format=config.METRICS_EXPORT_FORMAT,
+                          export_interval=config.METRICS_EXPORT_SECONDS)
+    else:
+        metrics = NullMetrics()
+    return metrics
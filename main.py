@@ -1,26 +1,52 @@
 import cv2
-import face_recognition
-import numpy as np
 import os
 from datetime import datetime
-import csv
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 from PIL import Image, ImageTk
-import pickle
+import config
+import instrumentation
+from attendance_index import AttendanceIndex
+from attendance_writer import AttendanceWriter
+from camera_roi import RegionsOfInterest
+from encoding_cache import rebuild_roster
+from encoding_store import EncodingStore, ModelMismatchError
+from face_analysis import detect_faces, encode_faces, get_encoder
+from face_matcher import FaceMatcher
+from frame_scheduler import FrameScheduler
+from motion_gate import MotionGate
+from multi_camera import MultiCameraSession
+from pipeline import RecognitionPipeline
+from recognizer import FaceRecognizer
+from worker_pool import InferencePool
 
 class FaceRecognitionAttendanceSystem:
     def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.matcher = FaceMatcher.from_config()
+        self.store = EncodingStore.from_config()
         self.attendance_marked = set()
         
+        # Attendance rows are written in the background
+        self.attendance = AttendanceWriter.from_config()
+        
+        # Per-stage latency metrics, if enabled in config
+        instrumentation.configure()
+        
+        # Students already marked today, shared with other sessions
+        self.attendance_index = AttendanceIndex(config.ATTENDANCE_DIR, self.attendance)
+        self.attendance_index.load(datetime.now().strftime('%Y-%m-%d'))
+        
         # Create necessary directories
         self.create_directories()
         
         # Load existing face encodings
         self.load_encodings()
         
+    @property
+    def known_face_names(self):
+        """Names of the registered students"""
+        return self.matcher.students
+        
     def create_directories(self):
         """Create necessary directories for the system"""
         directories = ['students_images', 'attendance_records', 'encodings']
@@ -30,26 +56,45 @@ class FaceRecognitionAttendanceSystem:
                 
     def load_encodings(self):
         """Load previously saved face encodings"""
-        encoding_file = 'encodings/face_encodings.pkl'
-        if os.path.exists(encoding_file):
+        # The store is tagged with the encoder's model, so check the encoder loads before touching it
+        try:
+            get_encoder()
+        except (ImportError, OSError, ValueError, cv2.error) as e:
+            print(f"Error loading the '{config.EMBEDDING_BACKEND}' face encoder: {e}")
+            print("Encodings were not loaded; check EMBEDDING_BACKEND and the model files in config.py")
+            return
+            
+        try:
+            # One-shot migration from the old pickle file
+            if not self.store.exists() and os.path.exists(config.ENCODINGS_FILE):
+                count = self.store.migrate_from_pickle(config.ENCODINGS_FILE)
+                print(f"Migrated {count} face encodings to {config.ENCODING_STORE_DIR}")
+                
+            self.load_store()
+        except ModelMismatchError as e:
+            # Encodings of different models are never mixed; re-encode from the saved photos
+            print(f"{e}; re-encoding the roster from {config.STUDENTS_DIR}")
             try:
-                with open(encoding_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data['encodings']
-                    self.known_face_names = data['names']
-                print(f"Loaded {len(self.known_face_names)} face encodings")
+                summary = rebuild_roster(self.store)
+                if summary['dropped_students']:
+                    print(f"Students without photos were not re-encoded (kept in {summary['archived_roster']}): "
+                          f"{', '.join(summary['dropped_students'])}")
+                self.load_store()
             except Exception as e:
-                print(f"Error loading encodings: {e}")
+                print(f"Error re-encoding the roster: {e}")
+        except Exception as e:
+            print(f"Error loading encodings: {e}")
+            
+    def load_store(self):
+        """Load the encoding store into the matcher, if it has been written"""
+        if self.store.exists():
+            encodings, norms, names = self.store.load()
+            self.matcher = FaceMatcher.from_config(encodings, names, norms)
+            print(f"Loaded {len(names)} face encodings for {len(self.known_face_names)} students")
                 
     def save_encodings(self):
-        """Save face encodings to file"""
-        encoding_file = 'encodings/face_encodings.pkl'
-        data = {
-            'encodings': self.known_face_encodings,
-            'names': self.known_face_names
-        }
-        with open(encoding_file, 'wb') as f:
-            pickle.dump(data, f)
+        """Write a full snapshot of the face encodings"""
+        self.store.save(self.matcher.matrix, self.matcher.names)
         print("Encodings saved successfully")
         
     def add_new_student(self, name, num_images=5):
@@ -58,7 +103,7 @@ class FaceRecognitionAttendanceSystem:
         if not os.path.exists(student_dir):
             os.makedirs(student_dir)
             
-        cap = cv2.VideoCapture(0)
+        cap = cv2.VideoCapture(config.CAMERA_INDEX)
         
         # Check if camera opened successfully
         if not cap.isOpened():
@@ -93,11 +138,11 @@ class FaceRecognitionAttendanceSystem:
                 cv2.imwrite(image_path, frame)
                 
                 # Get face encoding
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
+                # Full resolution, with the configured detector
+                face_locations = detect_faces(frame, 1.0)
                 
                 if face_locations:
-                    face_encoding = face_recognition.face_encodings(rgb_frame, face_locations)[0]
+                    face_encoding = encode_faces(frame, face_locations)[0]
                     encodings_list.append(face_encoding)
                     count += 1
                     print(f"Captured image {count}/{num_images}")
@@ -113,12 +158,10 @@ class FaceRecognitionAttendanceSystem:
         cap.release()
         cv2.destroyAllWindows()
         
-        # Average the encodings
+        # Keep every capture as a separate template
         if encodings_list:
-            avg_encoding = np.mean(encodings_list, axis=0)
-            self.known_face_encodings.append(avg_encoding)
-            self.known_face_names.append(name)
-            self.save_encodings()
+            self.matcher.add(encodings_list, name)
+            self.store.append_add(encodings_list, name)
             print(f"\n{name} added successfully!")
             return True
         return False
@@ -129,21 +172,12 @@ class FaceRecognitionAttendanceSystem:
         date_string = now.strftime('%Y-%m-%d')
         time_string = now.strftime('%H:%M:%S')
         
-        # Create attendance file for today
-        filename = f'attendance_records/attendance_{date_string}.csv'
-        
-        # Check if student already marked today
-        if name in self.attendance_marked:
+        # Check if student already marked today, in any session
+        if not self.attendance_index.add(name, date_string):
             return False
             
-        # Write to CSV
-        file_exists = os.path.exists(filename)
-        with open(filename, 'a', newline='') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(['Name', 'Date', 'Time'])
-            writer.writerow([name, date_string, time_string])
-            
+        # Queue the row; the background writer appends it to today's CSV
+        self.attendance.mark(name, date_string, time_string)
         self.attendance_marked.add(name)
         return True
     
@@ -152,15 +186,11 @@ class FaceRecognitionAttendanceSystem:
         if name not in self.known_face_names:
             return False
         
-        # Find index of the student
-        index = self.known_face_names.index(name)
-        
-        # Remove from lists
-        del self.known_face_names[index]
-        del self.known_face_encodings[index]
+        # Remove every encoding stored for the student
+        self.matcher.remove_name(name)
         
-        # Save updated encodings
-        self.save_encodings()
+        # Record the deletion in the journal
+        self.store.append_remove(name)
         
         # Delete student images folder
         import shutil
@@ -175,9 +205,40 @@ class FaceRecognitionAttendanceSystem:
         """Get list of all registered students"""
         return self.known_face_names.copy()
         
+    def on_face_recognized(self, name):
+        """Mark attendance for a recognized face"""
+        with instrumentation.metrics.stage('attendance'):
+            marked = self.mark_attendance(name)
+        if marked:
+            print(f"Attendance marked for {name}")
+            
+    def draw_results(self, frame, results):
+        """Draw the latest recognition results onto a display frame"""
+        face_locations, face_names = results if results else ([], [])
+        for (top, right, bottom, left), name in zip(face_locations, face_names):
+            # Draw rectangle around face
+            color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            
+            # Draw label
+            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
+            cv2.putText(frame, name, (left + 6, bottom - 6),
+                       cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+                       
+        # Display attendance status
+        cv2.putText(frame, f"Attendance Marked: {len(self.attendance_marked)}", (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
+        # Display instructions
+        cv2.putText(frame, "Press 'q' to Quit", (10, 70),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        
     def recognize_faces(self):
         """Real-time face recognition and attendance marking"""
-        cap = cv2.VideoCapture(0)
+        if len(config.CAMERA_SOURCES) > 1:
+            return self.recognize_faces_multi(config.CAMERA_SOURCES)
+            
+        cap = cv2.VideoCapture(config.CAMERA_SOURCES[0])
         
         # Check if camera opened successfully
         if not cap.isOpened():
@@ -190,82 +251,81 @@ class FaceRecognitionAttendanceSystem:
         print("\nStarting face recognition...")
         print("Press 'q' to quit")
         
-        frame_count = 0
-        process_every_n_frames = 2  # Process every 2nd frame for better performance
-        face_locations = []
-        face_names = []
+        # Detection is limited to the camera's regions of interest, if configured
+        roi = RegionsOfInterest.from_config(config.CAMERA_SOURCES[0])
+        if roi is not None:
+            shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+            print(f"Detection limited to {roi.coverage(shape):.0%} of the frame")
+            
+        # Faces are tracked between frames so known faces are not re-encoded
+        recognizer = FaceRecognizer(self.matcher, on_match=self.on_face_recognized, roi=roi)
+        
+        # Fan detection and encoding out over worker processes if configured
+        pool = None
+        if config.INFERENCE_WORKERS > 1:
+            pool = InferencePool(recognizer.analyze, config.INFERENCE_WORKERS)
+            
+        # Capture, recognition and display run on separate threads
+        pipeline = RecognitionPipeline(cap, recognizer.analyze, recognizer.identify, self.draw_results,
+                                       'Face Recognition Attendance System',
+                                       queue_size=config.PIPELINE_QUEUE_SIZE,
+                                       display_fps=config.DISPLAY_FPS, pool=pool,
+                                       scheduler=FrameScheduler.from_config(config.INFERENCE_WORKERS),
+                                       gate=MotionGate.from_config(), roi=roi,
+                                       show_metrics=config.SHOW_PIPELINE_METRICS)
+        try:
+            stats = pipeline.run()
+        finally:
+            cap.release()
+            cv2.destroyAllWindows()
+            if pool is not None:
+                pool.close()
+            
+        metrics = pipeline.metrics()
+        print(f"Display: {stats['display_fps']:.1f} FPS, recognition: {stats['inference_fps']:.1f} FPS "
+              f"(every {metrics['every_n']} frame(s)), dropped frames: {stats['frames_dropped']}, "
+              f"static frames skipped: {stats['frames_gated']}")
+        if recognizer.tracker is not None:
+            print(f"Face encodings run: {recognizer.tracker.encodings_run}, "
+                  f"skipped by tracking: {recognizer.tracker.encodings_skipped}")
+        if recognizer.faces_rejected:
+            print(f"Faces skipped by the quality gate: {recognizer.faces_rejected} {recognizer.quality_breakdown()}")
+        return len(self.attendance_marked)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Failed to read frame")
-                break
-                
-            frame_count += 1
-            
-            # Process only every nth frame
-            if frame_count % process_every_n_frames == 0:
-                # Resize frame for faster processing
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                # Find faces in frame
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-                
-                face_names = []
-                for face_encoding in face_encodings:
-                    # Compare with known faces
-                    matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                    name = "Unknown"
-                    
-                    # Use the known face with smallest distance
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    if len(face_distances) > 0:
-                        best_match_index = np.argmin(face_distances)
-                        if matches[best_match_index]:
-                            name = self.known_face_names[best_match_index]
-                            
-                            # Mark attendance
-                            if self.mark_attendance(name):
-                                print(f"Attendance marked for {name}")
-                                
-                    face_names.append(name)
-                    
-            # Display results
-            for (top, right, bottom, left), name in zip(face_locations, face_names):
-                # Scale back up face locations
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                
-                # Draw rectangle around face
-                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                
-                # Draw label
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-                cv2.putText(frame, name, (left + 6, bottom - 6),
-                           cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
-                           
-            # Display attendance status
-            cv2.putText(frame, f"Attendance Marked: {len(self.attendance_marked)}", (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            # Display instructions
-            cv2.putText(frame, "Press 'q' to Quit", (10, 70),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-            
-            cv2.imshow('Face Recognition Attendance System', frame)
-            
-            # Quit on 'q' key
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-                
-        cap.release()
-        cv2.destroyAllWindows()
+    def recognize_faces_multi(self, sources):
+        """Recognition across several cameras sharing one matcher"""
+        self.attendance_marked.clear()
         
+        print(f"\nStarting face recognition on {len(sources)} cameras...")
+        print("Press 'q' to quit")
+        
+        pool = None
+        if config.INFERENCE_WORKERS > 1:
+            pool = InferencePool(FaceRecognizer(self.matcher).analyze, config.INFERENCE_WORKERS)
+            
+        session = MultiCameraSession(sources, self.matcher, self.draw_results,
+                                     'Face Recognition Attendance System',
+                                     on_match=self.on_face_recognized, pool=pool,
+                                     gate_factory=MotionGate.from_config,
+                                     roi_factory=RegionsOfInterest.from_config,
+                                     display_fps=config.DISPLAY_FPS,
+                                     tile_width=config.MULTI_CAMERA_TILE_WIDTH,
+                                     show_metrics=config.SHOW_PIPELINE_METRICS)
+        try:
+            stats, camera_stats = session.run()
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 0
+        finally:
+            cv2.destroyAllWindows()
+            if pool is not None:
+                pool.close()
+                
+        for source, camera in zip(sources, camera_stats):
+            print(f"Camera {source}: capture {camera['capture_fps']:.1f} FPS, "
+                  f"recognition {camera['recognition_fps']:.1f} FPS, latency {camera['latency_ms']:.0f} ms")
+        print(f"Faces matched: {stats['faces_matched']} in {stats['ticks']} batches, "
+              f"cross-camera duplicates suppressed: {stats['duplicates_suppressed']}")
         return len(self.attendance_marked)
 
 class AttendanceSystemGUI:
@@ -727,15 +787,15 @@ class AttendanceSystemGUI:
         
     def view_attendance(self):
         date_string = datetime.now().strftime('%Y-%m-%d')
-        filename = f'attendance_records/attendance_{date_string}.csv'
         
-        if not os.path.exists(filename):
+        # Read through the attendance backend, including queued marks
+        rows = self.system.attendance.day(date_string)
+        
+        if not rows:
             messagebox.showinfo("Info", "No attendance records for today")
             return
             
-        # Read and display attendance
-        with open(filename, 'r') as f:
-            content = f.read()
+        content = "Name,Date,Time\n" + "".join(",".join(row) + "\n" for row in rows)
             
         # Create new window with modern design
         window = tk.Toplevel(self.root)
@@ -915,6 +975,10 @@ def main():
     root = tk.Tk()
     app = AttendanceSystemGUI(root)
     root.mainloop()
+    app.system.attendance.close()
+    app.system.attendance_index.close()
+    instrumentation.metrics.close()
+    app.system.store.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,79 @@
+"""
+Motion-gated recognition
+Compares a tiny grayscale thumbnail of each frame with a running
+background and lets frames through to face detection only when enough
+pixels change, plus a periodic forced refresh
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+class MotionGate:
+    def __init__(self, threshold=0.01, pixel_delta=25, thumbnail_width=64,
+                 refresh_interval=5.0, hold_time=2.0, learning_rate=0.05):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.thumbnail_width = thumbnail_width
+        self.refresh_interval = refresh_interval
+        self.hold_time = hold_time
+        self.learning_rate = learning_rate
+
+        self._background = None
+        self._active_until = 0.0
+        self._last_pass = 0.0
+        self.changed_fraction = 0.0
+        self.frames_passed = 0
+        self.frames_skipped = 0
+        self.forced_refreshes = 0
+
+    @classmethod
+    def from_config(cls):
+        """Create a gate from the settings in config.py, or None if gating is off"""
+        if not config.MOTION_GATING:
+            return None
+        return cls(threshold=config.MOTION_THRESHOLD,
+                   pixel_delta=config.MOTION_PIXEL_DELTA,
+                   refresh_interval=config.MOTION_REFRESH_SECONDS,
+                   hold_time=config.MOTION_HOLD_SECONDS)
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.thumbnail_width, max(1, round(height * self.thumbnail_width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def should_process(self, frame):
+        """Return True if the frame should go on to face detection"""
+        now = time.monotonic()
+        gray = self._thumbnail(frame)
+
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            return self._pass(now)
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        self.changed_fraction = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        # Keep detecting for a moment after motion so arrivals are not missed
+        if self.changed_fraction >= self.threshold:
+            self._active_until = now + self.hold_time
+        if now < self._active_until:
+            return self._pass(now)
+
+        if now - self._last_pass >= self.refresh_interval:
+            self.forced_refreshes += 1
+            return self._pass(now)
+
+        self.frames_skipped += 1
+        return False
+
+    def _pass(self, now):
+        self._last_pass = now
+        self.frames_passed += 1
+        return True
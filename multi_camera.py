@@ -0,0 +1,269 @@
+"""
+Multi-camera recognition session
+Captures from several cameras or video files at once and recognises
+them against one shared roster: every tick takes the freshest frame of
+each stream, matches the faces of all streams in a single call and
+reports each student once, whichever camera saw them
+"""
+
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import instrumentation
+from recognizer import FaceRecognizer
+
+class CameraStream:
+    def __init__(self, source, gate=None, roi=None):
+        self.source = source
+        self.gate = gate
+        self.roi = roi
+        self.cap = None
+        self.stopped = threading.Event()
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_time = None
+        self._seq = 0
+        self._taken_seq = 0
+        self.results = None
+
+        self.stats = {
+            'frames_captured': 0,
+            'frames_processed': 0,
+            'frames_gated': 0,
+            'capture_fps': 0.0,
+            'recognition_fps': 0.0,
+            'latency_ms': 0.0,
+        }
+
+    def open(self):
+        """Open the camera device or video file; returns False on failure"""
+        self.cap = cv2.VideoCapture(self.source)
+        return self.cap.isOpened()
+
+    def capture_loop(self, stop):
+        """Keep the freshest frame; video files are paced at their own frame rate"""
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if isinstance(self.source, str) else 0
+        interval = 1.0 / fps if fps and fps > 0 else 0
+        next_frame = time.perf_counter()
+
+        while not stop.is_set():
+            with instrumentation.metrics.stage('capture'):
+                ret, frame = self.cap.read()
+            if not ret:
+                break
+            with self._lock:
+                self._frame = frame
+                self._frame_time = time.perf_counter()
+                self._seq += 1
+                self.stats['frames_captured'] += 1
+
+            if interval:
+                next_frame += interval
+                delay = next_frame - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        self.stopped.set()
+
+    def take(self):
+        """The freshest frame not yet recognised as (frame, capture time), or None"""
+        with self._lock:
+            if self._seq == self._taken_seq:
+                return None
+            self._taken_seq = self._seq
+            frame, captured = self._frame, self._frame_time
+
+        if self.gate is not None and not self.gate.should_process(frame):
+            self.stats['frames_gated'] += 1
+            return None
+        return frame, captured
+
+    def latest_frame(self):
+        with self._lock:
+            return None if self._frame is None else self._frame.copy()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+class MultiCameraSession:
+    def __init__(self, sources, matcher, draw, window_name, on_match=None, pool=None, tracking=None,
+                 gate_factory=None, roi_factory=None, display_fps=30, tile_width=640, show_metrics=False):
+        self.matcher = matcher
+        self.draw = draw
+        self.window_name = window_name
+        self.on_match = on_match
+        self.pool = pool
+        self.display_interval = 1.0 / display_fps if display_fps else 0
+        self.tile_width = tile_width
+        self.show_metrics = show_metrics
+
+        self.streams = [CameraStream(source, gate_factory() if gate_factory else None,
+                                     roi_factory(source) if roi_factory else None)
+                        for source in sources]
+        # One tracker per camera, one matcher for all of them
+        self.recognizers = [FaceRecognizer(matcher, tracking=tracking, roi=stream.roi) for stream in self.streams]
+
+        self._stop = threading.Event()
+        self._error = None
+        self._started = None
+        # Student -> camera that reported them, and (student, camera) pairs already counted as duplicates
+        self._reported = {}
+        self._duplicates = set()
+        self.stats = {'ticks': 0, 'faces_matched': 0, 'duplicates_suppressed': 0}
+
+    def _analyze(self, batch):
+        """Detection (and encoding) for every frame of the tick"""
+        if self.pool is None:
+            return [self.recognizers[i].analyze(frame) for i, frame, _ in batch]
+        # The pool's function is shared, so each camera's regions travel with its frame
+        for i, frame, _ in batch:
+            self.pool.submit(frame, roi=self.streams[i].roi)
+        return [self.pool.get()[1] for _ in batch]
+
+    def _tick(self):
+        batch = []
+        for i, stream in enumerate(self.streams):
+            taken = stream.take()
+            if taken is not None:
+                batch.append((i, *taken))
+        if not batch:
+            return False
+
+        analyses = self._analyze(batch)
+        staged = [self.recognizers[i].stage(frame, analysis)
+                  for (i, frame, _), analysis in zip(batch, analyses)]
+
+        # One matching call for the faces of every camera
+        counts = [len(encodings) for *_, encodings in staged]
+        all_encodings = [encoding for *_, encodings in staged for encoding in encodings]
+        with instrumentation.metrics.stage('match'):
+            all_names = self.matcher.identify(all_encodings) if all_encodings else []
+        self.stats['faces_matched'] += len(all_names)
+
+        offset = 0
+        now = time.perf_counter()
+        for (i, _, captured), stage, count in zip(batch, staged, counts):
+            names = all_names[offset:offset + count]
+            offset += count
+            stream = self.streams[i]
+            stream.results = self.recognizers[i].complete(stage, names)
+            stream.stats['frames_processed'] += 1
+            stream.stats['latency_ms'] = (now - captured) * 1000
+            instrumentation.metrics.observe('recognition', now - captured)
+            self._report(names, i)
+
+        self.stats['ticks'] += 1
+        return True
+
+    def _report(self, names, camera):
+        """Report each student once per session, whichever camera saw them"""
+        for name in names:
+            if name == "Unknown":
+                continue
+            if name in self._reported:
+                # Counted once per other camera that also sees the student
+                if self._reported[name] != camera and (name, camera) not in self._duplicates:
+                    self._duplicates.add((name, camera))
+                    self.stats['duplicates_suppressed'] += 1
+                continue
+            self._reported[name] = camera
+            if self.on_match is not None:
+                self.on_match(name)
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self._tick():
+                    if all(stream.stopped.is_set() for stream in self.streams):
+                        break
+                    time.sleep(0.005)
+            except Exception as e:
+                self._error = e
+                break
+        self._stop.set()
+
+    def _update_rates(self):
+        elapsed = time.perf_counter() - self._started
+        if elapsed <= 0:
+            return
+        for stream in self.streams:
+            stream.stats['capture_fps'] = stream.stats['frames_captured'] / elapsed
+            stream.stats['recognition_fps'] = stream.stats['frames_processed'] / elapsed
+
+    def _mosaic(self):
+        """Tile the latest frame of every camera, with its results drawn on"""
+        tiles = []
+        tile_height = None
+        for i, stream in enumerate(self.streams):
+            frame = stream.latest_frame()
+            if frame is None:
+                tiles.append(None)
+                continue
+            self.draw(frame, stream.results)
+            if stream.roi is not None:
+                stream.roi.draw(frame)
+            if self.show_metrics:
+                cv2.putText(frame, f"Camera {i + 1}: {stream.stats['capture_fps']:.1f} FPS | "
+                                   f"{stream.stats['latency_ms']:.0f} ms",
+                            (10, frame.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            if tile_height is None:
+                tile_height = round(frame.shape[0] * self.tile_width / frame.shape[1])
+            tiles.append(cv2.resize(frame, (self.tile_width, tile_height)))
+        if tile_height is None:
+            return None
+
+        blank = np.zeros((tile_height, self.tile_width, 3), dtype=np.uint8)
+        tiles = [tile if tile is not None and tile.shape[0] == tile_height else blank for tile in tiles]
+        columns = math.ceil(math.sqrt(len(tiles)))
+        tiles += [blank] * (-len(tiles) % columns)
+        rows = [np.hstack(tiles[r:r + columns]) for r in range(0, len(tiles), columns)]
+        return np.vstack(rows)
+
+    def run(self):
+        """Display loop; runs until 'q' is pressed or every source has stopped
+
+        Returns (session stats, per-camera stats).
+        """
+        for stream in self.streams:
+            if not stream.open():
+                for opened in self.streams:
+                    opened.release()
+                raise ValueError(f"Could not open camera {stream.source}")
+
+        self._started = time.perf_counter()
+        workers = [threading.Thread(target=stream.capture_loop, args=(self._stop,), daemon=True)
+                   for stream in self.streams]
+        workers.append(threading.Thread(target=self._inference_loop, daemon=True))
+        for worker in workers:
+            worker.start()
+
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                self._update_rates()
+                with instrumentation.metrics.stage('display'):
+                    mosaic = self._mosaic()
+                    if mosaic is not None:
+                        cv2.imshow(self.window_name, mosaic)
+                    key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+                delay = self.display_interval - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join(timeout=2)
+            for stream in self.streams:
+                stream.release()
+            self._update_rates()
+
+        if self._error is not None:
+            raise self._error
+        return self.stats, [stream.stats for stream in self.streams]
@@ -0,0 +1,232 @@
+"""
+Threaded recognition pipeline
+A capture thread keeps only the freshest frames, an inference worker
+processes them as fast as the CPU allows and the display loop redraws
+the most recent results at camera rate
+
+Each frame goes through analyze (detection, and encoding unless faces
+are tracked), either on the inference thread or fanned out over an
+InferencePool, and then through identify(frame, analysis) on the
+inference thread, which returns (face_locations, face_names)
+"""
+
+import queue
+import threading
+import time
+
+import cv2
+
+import instrumentation
+
+# Stages shown on the latency overlay, in pipeline order
+OVERLAY_STAGES = ('capture', 'preprocess', 'detect', 'quality', 'encode', 'match', 'attendance', 'display')
+
+class RecognitionPipeline:
+    def __init__(self, cap, analyze, identify, draw, window_name, queue_size=2, display_fps=30, pool=None,
+                 scheduler=None, gate=None, roi=None, show_metrics=False):
+        self.cap = cap
+        self.analyze = analyze
+        self.identify = identify
+        self.draw = draw
+        self.pool = pool
+        self.scheduler = scheduler
+        self.gate = gate
+        # Regions detection is limited to, outlined on the display
+        self.roi = roi
+        self.show_metrics = show_metrics
+        self.window_name = window_name
+        self.display_interval = 1.0 / display_fps if display_fps else 0
+
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._new_frame = threading.Condition()
+        self._latest_frame = None
+        self._frame_seq = 0
+        self._results = None
+        self._results_lock = threading.Lock()
+        self._error = None
+        self._started = None
+        self._in_flight = {}
+        self._stage_text = None
+        self._stage_text_time = 0.0
+
+        self.stats = {
+            'frames_captured': 0,
+            'frames_displayed': 0,
+            'frames_processed': 0,
+            'frames_dropped': 0,
+            'frames_gated': 0,
+            'capture_fps': 0.0,
+            'display_fps': 0.0,
+            'inference_fps': 0.0,
+            'inference_ms': 0.0,
+        }
+
+    def _capture_loop(self):
+        """Read frames continuously, replacing stale ones in the inference queue"""
+        while not self._stop.is_set():
+            with instrumentation.metrics.stage('capture'):
+                ret, frame = self.cap.read()
+            if not ret:
+                print("Error: Failed to read frame")
+                break
+
+            with self._new_frame:
+                self._frame_seq += 1
+                self._latest_frame = frame
+                self.stats['frames_captured'] += 1
+                self._new_frame.notify_all()
+
+            # The scheduler decides which frames are worth recognising; it sees
+            # every captured frame so its camera FPS estimate stays accurate
+            if self.scheduler is not None and not self.scheduler.should_process():
+                continue
+
+            # Static scenes never reach detection
+            if self.gate is not None and not self.gate.should_process(frame):
+                self.stats['frames_gated'] += 1
+                continue
+
+            # Bounded queue: drop the oldest frame rather than fall behind
+            while True:
+                try:
+                    self._frames.put_nowait(frame)
+                    break
+                except queue.Full:
+                    try:
+                        self._frames.get_nowait()
+                        self.stats['frames_dropped'] += 1
+                    except queue.Empty:
+                        pass
+
+        self._stop.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+
+    def _inference_loop(self):
+        """Run detection and recognition on the freshest queued frames"""
+        while not self._stop.is_set():
+            try:
+                frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                if self.pool is not None:
+                    self._finish_pool_results()
+                continue
+
+            try:
+                if self.pool is None:
+                    start = time.perf_counter()
+                    self._finish(frame, start, self.analyze(frame))
+                else:
+                    # Keep one frame in flight per worker process
+                    while self.pool.in_flight >= self.pool.num_workers:
+                        seq, analysis = self.pool.get()
+                        self._finish(*self._in_flight.pop(seq), analysis=analysis)
+                    self._in_flight[self.pool.submit(frame)] = (frame, time.perf_counter())
+                    self._finish_pool_results()
+            except Exception as e:
+                self._error = e
+                self._stop.set()
+                break
+
+    def _finish_pool_results(self):
+        for seq, analysis in self.pool.ready():
+            self._finish(*self._in_flight.pop(seq), analysis=analysis)
+
+    def _finish(self, frame, start, analysis):
+        results = self.identify(frame, analysis)
+        with self._results_lock:
+            self._results = results
+        latency = time.perf_counter() - start
+        instrumentation.metrics.observe('recognition', latency)
+        self.stats['frames_processed'] += 1
+        self.stats['inference_ms'] = latency * 1000
+        if self.scheduler is not None:
+            self.scheduler.record(latency, len(results[0]) if results else 0)
+        elapsed = time.perf_counter() - self._started
+        if elapsed > 0:
+            self.stats['inference_fps'] = self.stats['frames_processed'] / elapsed
+
+    def metrics(self):
+        """Pipeline counters merged with the scheduler's live metrics"""
+        metrics = dict(self.stats)
+        if self.scheduler is not None:
+            metrics.update(self.scheduler.metrics())
+        return metrics
+
+    def _draw_metrics(self, frame):
+        metrics = self.metrics()
+        text = f"Recognition {metrics['inference_fps']:.1f} FPS | {metrics['inference_ms']:.0f} ms"
+        if self.scheduler is not None:
+            text += f" | every {metrics['every_n']} frame(s)"
+        cv2.putText(frame, text, (10, frame.shape[0] - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        if instrumentation.metrics.enabled:
+            # Percentiles are recomputed once a second, not every redraw
+            now = time.perf_counter()
+            if now - self._stage_text_time >= 1.0:
+                stages = instrumentation.metrics.snapshot()['stages']
+                self._stage_text = "p95 " + " | ".join(
+                    f"{name} {stages[name]['p95_ms']:.1f}" for name in OVERLAY_STAGES if name in stages) + " ms"
+                self._stage_text_time = now
+            cv2.putText(frame, self._stage_text, (10, frame.shape[0] - 35),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+
+    def latest_results(self):
+        with self._results_lock:
+            return self._results
+
+    def run(self):
+        """Display loop; runs on the calling thread until 'q' is pressed or capture stops"""
+        self._started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._inference_loop, daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        shown_seq = 0
+        next_display = 0.0
+        try:
+            while not self._stop.is_set():
+                with self._new_frame:
+                    if self._frame_seq == shown_seq:
+                        self._new_frame.wait(timeout=0.1)
+                    if self._frame_seq == shown_seq or self._latest_frame is None:
+                        continue
+                    shown_seq = self._frame_seq
+                    frame = self._latest_frame.copy()
+
+                # Never redraw faster than the target display rate
+                now = time.perf_counter()
+                if now < next_display:
+                    continue
+                next_display = now + self.display_interval
+
+                with instrumentation.metrics.stage('display'):
+                    self.draw(frame, self.latest_results())
+                    if self.roi is not None:
+                        self.roi.draw(frame)
+                    if self.show_metrics:
+                        self._draw_metrics(frame)
+                    cv2.imshow(self.window_name, frame)
+                    key = cv2.waitKey(1) & 0xFF
+                self.stats['frames_displayed'] += 1
+
+                if key == ord('q'):
+                    break
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join(timeout=2)
+
+            elapsed = time.perf_counter() - self._started
+            if elapsed > 0:
+                self.stats['capture_fps'] = self.stats['frames_captured'] / elapsed
+                self.stats['display_fps'] = self.stats['frames_displayed'] / elapsed
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
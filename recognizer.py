@@ -0,0 +1,119 @@
+"""
+Frame-level face recognition shared by the GUI, the CLI and offline tools
+analyze() is the per-frame detection step (safe to run in worker
+processes); identify() finishes a frame on the calling thread: tracking,
+encoding where needed and matching against the roster
+"""
+
+import functools
+
+import config
+import instrumentation
+from face_analysis import detect_and_encode, detect_faces, encode_gated, get_quality_gate
+from face_quality import REASONS
+from face_tracker import FaceTracker
+
+class FaceRecognizer:
+    def __init__(self, matcher, on_match=None, tracking=None, roi=None):
+        self.matcher = matcher
+        self.on_match = on_match
+        # Detection is limited to these regions of the frame, if given
+        self.roi = roi
+        tracking = config.TRACKING_ENABLED if tracking is None else tracking
+
+        # Faces the quality gate kept away from the encoder, in total and per reason
+        self.faces_rejected = 0
+        self.rejections = {reason: 0 for reason in REASONS}
+
+        self.tracker = None
+        if tracking:
+            self.tracker = FaceTracker(iou_threshold=config.TRACK_IOU_THRESHOLD,
+                                       max_missed=config.TRACK_MAX_MISSED,
+                                       confirm_hits=config.TRACK_CONFIRM_HITS,
+                                       reverify_interval=config.TRACK_REVERIFY_INTERVAL)
+
+    @property
+    def analyze(self):
+        """Picklable per-frame analysis function for this mode"""
+        analyze = detect_faces if self.tracker is not None else detect_and_encode
+        return functools.partial(analyze, roi=self.roi) if self.roi is not None else analyze
+
+    def process_frame(self, frame):
+        """Analyse and identify a single frame; returns (face_locations, face_names)"""
+        return self.identify(frame, self.analyze(frame))
+
+    def identify(self, frame, analysis):
+        """Turn the result of analyze() into (face_locations, face_names)"""
+        staged = self.stage(frame, analysis)
+        with instrumentation.metrics.stage('match'):
+            names = self.matcher.identify(staged[-1])
+        return self.complete(staged, names)
+
+    def stage(self, frame, analysis):
+        """First half of identify(): the faces that still need matching
+
+        Returns (face_locations, tracks, pending, face_encodings); the
+        encodings can be matched together with other frames' and the
+        names passed to complete().
+        """
+        if self.tracker is None:
+            face_locations, face_encodings, reasons = analysis
+            self._count_rejections(reasons)
+            pending = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+            return face_locations, None, pending, [face_encodings[i] for i in pending]
+
+        # Only new tracks and tracks due for a re-verify are encoded
+        face_locations = analysis
+        tracks = self.tracker.update(face_locations)
+        due = [i for i, track in enumerate(tracks) if self.tracker.needs_encoding(track)]
+        encodings, reasons = encode_gated(frame, [face_locations[i] for i in due], get_quality_gate())
+        self._count_rejections(reasons)
+
+        # Rejected faces stay due and are retried on the next frame
+        pending = [i for i, encoding in zip(due, encodings) if encoding is not None]
+        face_encodings = [encoding for encoding in encodings if encoding is not None]
+        self.tracker.encodings_run += len(pending)
+        self.tracker.encodings_skipped += len(tracks) - len(due)
+        return face_locations, tracks, pending, face_encodings
+
+    def complete(self, staged, names):
+        """Second half of identify(): apply the matched names of stage()'s encodings"""
+        face_locations, tracks, pending, _ = staged
+        metrics = instrumentation.metrics
+        if metrics.enabled:
+            unknowns = sum(1 for name in names if name == "Unknown")
+            metrics.count('faces', len(face_locations))
+            metrics.count('matches', len(names) - unknowns)
+            metrics.count('unknowns', unknowns)
+        self._report(names)
+        if self.tracker is None:
+            face_names = ["Unknown"] * len(face_locations)
+            for i, name in zip(pending, names):
+                face_names[i] = name
+            return face_locations, face_names
+
+        for i, name in zip(pending, names):
+            self.tracker.record(tracks[i], name)
+        return face_locations, [track.name for track in tracks]
+
+    def _count_rejections(self, reasons):
+        rejected = [reason for reason in reasons if reason is not None]
+        if not rejected:
+            return
+        self.faces_rejected += len(rejected)
+        instrumentation.metrics.count('faces_rejected', len(rejected))
+        for reason in rejected:
+            self.rejections[reason] += 1
+            instrumentation.metrics.count(f'quality_{reason}')
+
+    def quality_breakdown(self):
+        """Quality gate skips per reason, e.g. '(3 small, 1 blurry)'"""
+        parts = [f"{count} {reason}" for reason, count in self.rejections.items() if count]
+        return f"({', '.join(parts)})" if parts else ''
+
+    def _report(self, face_names):
+        if self.on_match is None:
+            return
+        for name in face_names:
+            if name != "Unknown":
+                self.on_match(name)
@@ -0,0 +1,123 @@
+"""
+Headless recognition of recorded video files
+Decodes as fast as the CPU allows instead of at playback rate, runs
+recognition on frames sampled by source time without opening a window
+and reports attendance against the timestamp in the recording
+"""
+
+import collections
+import csv
+import os
+import time
+
+import cv2
+
+import config
+from worker_pool import InferencePool
+
+def format_timestamp(seconds):
+    """Source timestamp as HH:MM:SS.mmm"""
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
+
+class VideoProcessor:
+    def __init__(self, recognizer, sample_interval=0.5, workers=1):
+        self.recognizer = recognizer
+        self.sample_interval = sample_interval
+        self.workers = workers
+
+    @classmethod
+    def from_config(cls, recognizer):
+        """Create a processor using the offline settings in config.py"""
+        return cls(recognizer, sample_interval=config.OFFLINE_SAMPLE_SECONDS,
+                   workers=config.OFFLINE_WORKERS or os.cpu_count() or 1)
+
+    def _frames(self, cap, step, fps, sampled, stats):
+        """Yield sampled frames, only grabbing (not converting) the ones in between"""
+        frame_index = 0
+        while True:
+            if frame_index % step:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                timestamp = frame_index / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                sampled.append((frame, timestamp))
+                yield frame
+            frame_index += 1
+            stats['frames'] = frame_index
+
+    def process(self, path, on_attendance=None):
+        """Recognise every student in a video file
+
+        Returns (attendance, stats): attendance maps each name to the
+        source timestamp in seconds where it was first recognised.
+        on_attendance(name, timestamp) is called at each first sighting.
+        """
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        step = max(1, round(self.sample_interval * fps)) if fps > 0 else 1
+        stats = {'frames': 0, 'frames_processed': 0, 'faces': 0}
+        attendance = {}
+        sampled = collections.deque()
+        frames = self._frames(cap, step, fps, sampled, stats)
+
+        start = time.perf_counter()
+        pool = None
+        try:
+            if self.workers > 1:
+                first = next(frames, None)
+                if first is not None:
+                    # Ring slots sized to this video's frames
+                    pool = InferencePool(self.recognizer.analyze, self.workers, slot_bytes=first.nbytes)
+                    results = (analysis for _, analysis in pool.map(self._chain(first, frames)))
+                else:
+                    results = iter(())
+            else:
+                results = (self.recognizer.analyze(frame) for frame in frames)
+
+            for analysis in results:
+                frame, timestamp = sampled.popleft()
+                face_locations, face_names = self.recognizer.identify(frame, analysis)
+                stats['frames_processed'] += 1
+                stats['faces'] += len(face_locations)
+                for name in face_names:
+                    if name != "Unknown" and name not in attendance:
+                        attendance[name] = timestamp
+                        if on_attendance is not None:
+                            on_attendance(name, timestamp)
+        finally:
+            if pool is not None:
+                pool.close()
+            cap.release()
+
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = elapsed
+        stats['duration'] = stats['frames'] / fps if fps > 0 else 0.0
+        stats['fps'] = stats['frames'] / elapsed if elapsed > 0 else 0.0
+        stats['processed_fps'] = stats['frames_processed'] / elapsed if elapsed > 0 else 0.0
+        stats['faces_per_second'] = stats['faces'] / elapsed if elapsed > 0 else 0.0
+        stats['speed'] = stats['duration'] / elapsed if elapsed > 0 else 0.0
+        return attendance, stats
+
+    @staticmethod
+    def _chain(first, frames):
+        yield first
+        yield from frames
+
+def write_attendance(video_path, attendance, csv_file):
+    """Write first-sighting attendance for a video, in source-time order"""
+    directory = os.path.dirname(csv_file)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Name', 'Video', 'Timestamp'])
+        for name, timestamp in sorted(attendance.items(), key=lambda item: item[1]):
+            writer.writerow([name, os.path.basename(video_path), format_timestamp(timestamp)])
@@ -0,0 +1,154 @@
+"""
+Multi-process inference pool
+Frames are copied once into shared-memory ring slots instead of being
+pickled; worker processes run the analysis function on them and the
+results are handed back in frame order
+"""
+
+import multiprocessing as mp
+import os
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import config
+
+def _worker_main(function, shm_name, slot_bytes, tasks, results):
+    """Worker process: analyse frames straight out of the shared ring"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, shape, dtype, options = task
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            try:
+                results.put((seq, slot, function(frame, **options), None))
+            except Exception as e:
+                results.put((seq, slot, None, f"{type(e).__name__}: {e}"))
+            finally:
+                # The view must go before the shared memory can be closed
+                del frame
+    finally:
+        shm.close()
+
+class InferencePool:
+    def __init__(self, function, num_workers=None, slot_bytes=None, slots=None):
+        self.function = function
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.slot_bytes = slot_bytes or config.MAX_FRAME_BYTES
+        self.slots = slots or 2 * self.num_workers
+
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        self._free_slots = list(range(self.slots))
+        self._tasks = mp.Queue()
+        self._results = mp.Queue()
+        self._finished = {}
+        self._next_seq = 0
+        self._next_result = 0
+
+        self._workers = [
+            mp.Process(target=_worker_main,
+                       args=(function, self._shm.name, self.slot_bytes, self._tasks, self._results),
+                       daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def in_flight(self):
+        """Frames submitted whose results have not been returned yet"""
+        return self._next_seq - self._next_result
+
+    def submit(self, frame, **options):
+        """Copy a frame into a free ring slot and queue it; returns its sequence number
+
+        options are passed on to the analysis function with the frame.
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.slot_bytes}-byte ring slot")
+
+        # Wait for a worker to release a slot if the ring is full
+        while not self._free_slots:
+            self._collect(block=True)
+
+        slot = self._free_slots.pop()
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf,
+                          offset=slot * self.slot_bytes)
+        view[...] = frame
+        del view
+
+        seq = self._next_seq
+        self._next_seq += 1
+        self._tasks.put((seq, slot, frame.shape, frame.dtype.str, options))
+        return seq
+
+    def _collect(self, block):
+        """Move one finished result into the reorder buffer; returns False if none"""
+        try:
+            seq, slot, result, error = self._results.get(block=block, timeout=1.0 if block else None)
+        except queue.Empty:
+            return False
+        self._free_slots.append(slot)
+        self._finished[seq] = (result, error)
+        return True
+
+    def _pop(self):
+        result, error = self._finished.pop(self._next_result)
+        seq = self._next_result
+        self._next_result += 1
+        if error is not None:
+            raise RuntimeError(f"Inference worker failed on frame {seq}: {error}")
+        return seq, result
+
+    def get(self):
+        """Block for the next result in submission order; returns (seq, result)"""
+        if self.in_flight == 0:
+            raise ValueError("No frames in flight")
+        while self._next_result not in self._finished:
+            if not self._collect(block=True) and not any(w.is_alive() for w in self._workers):
+                raise RuntimeError("All inference workers have exited")
+        return self._pop()
+
+    def ready(self):
+        """Return every (seq, result) that is ready, in order, without blocking"""
+        while self._collect(block=False):
+            pass
+        ready = []
+        while self._next_result in self._finished:
+            ready.append(self._pop())
+        return ready
+
+    def map(self, frames):
+        """Analyse an iterable of frames in parallel, yielding (seq, result) in order"""
+        for frame in frames:
+            if self.in_flight >= self.slots:
+                yield self.get()
+            self.submit(frame)
+        while self.in_flight:
+            yield self.get()
+
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        if self._shm is None:
+            return
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None